@@ -0,0 +1,273 @@
+"""
+Bounded-concurrency batch dispatch for Earth Engine extraction.
+
+Replaces the strictly sequential `getInfo()` + `time.sleep(1)` loop with a
+thread pool that keeps up to `max_in_flight` batch requests running at once,
+while a token bucket caps the rate at which new requests are started.
+Results are yielded back to the caller's thread in completion order; callers
+merge them into SNo-keyed dicts, so the final output order is unaffected.
+
+AdaptiveBatcher can be passed instead of a fixed list of batches: it bisects
+batches that fail and re-queues the halves, and learns a batch size for the
+run from observed latency and failures.
+"""
+
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens/second, at most `burst` stored."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until one token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_s = (1 - self._tokens) / self.rate
+            time.sleep(wait_s)
+
+
+def _timed_call(worker, batch):
+    t0 = time.time()
+    try:
+        return worker(batch), None, time.time() - t0
+    except Exception as e:
+        return None, e, time.time() - t0
+
+
+# Substrings of Earth Engine errors that mean "this request was too big"
+SIZE_ERROR_MARKERS = (
+    "payload",
+    "timed out",
+    "timeout",
+    "memory limit",
+    "too many elements",
+    "too many pixels",
+    "too large",
+    "accumulating over",
+)
+
+
+# Errors caused by an individual point (e.g. "Invalid point geometry for SNo 1500.")
+POINT_ERROR_RE = re.compile(r"\b(?:sno|point|geometry|coordinates?)\b", re.IGNORECASE)
+
+
+def is_size_error(error):
+    """True if an error message looks like a payload / timeout / memory limit."""
+    msg = str(error).lower()
+    return any(marker in msg for marker in SIZE_ERROR_MARKERS)
+
+
+def names_point(error):
+    """True if an error message points at a point rather than the whole request."""
+    return POINT_ERROR_RE.search(str(error)) is not None
+
+
+class RepeatedFailureError(RuntimeError):
+    """Too many consecutive batches failed with the same non-size error."""
+
+
+class AdaptiveBatcher:
+    """
+    Work queue of points that hands out batches of a learned size.
+
+    - Each new batch is cut from the remaining points at the current size,
+      so the size can grow as well as shrink over the run.
+    - A failed batch is split in half and both halves go back to the front of
+      the queue. Size errors and errors that name a point (see names_point)
+      are bisected down to single points; other errors stop at `min_size`
+      points. Callers can pass split=False for errors that splitting cannot
+      fix (e.g. an exhausted quota), which gives up on the whole batch.
+    - Splitting also stops once both halves of a split have failed with the
+      same non-size error: it is not caused by any one point (a bad band
+      name, a missing asset), so the halves and their descendants are given
+      up instead of bisected further.
+    - `max_repeated_failures` consecutive failures with the same non-size
+      error raise RepeatedFailureError, so a run-wide error is reported after
+      a handful of requests rather than after the whole queue.
+    - Size-related failures (see is_size_error) shrink the learned size to
+      half of the failing batch.
+    - Successful batches faster than `target_latency_s` grow the size by
+      `growth`; slower ones shrink it by `shrink`.
+
+    Every reported batch is kept in `history` as
+    {"batch", "size", "status", "elapsed_s", "learned_size"}.
+    """
+
+    def __init__(self, points, initial_size, min_size=50, max_size=5000,
+                 target_latency_s=30.0, growth=1.25, shrink=0.8,
+                 max_repeated_failures=10):
+        self._points = deque(points)
+        self._requeued = []  # re-queued halves; pop() from the end == front
+        # id(half) -> {"batch", "parent", "sibling", "error"} for split halves
+        self._splits = {}
+        self.max_repeated_failures = max_repeated_failures
+        self._last_failure = None
+        self._repeated_failures = 0
+        self.size = initial_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency_s = target_latency_s
+        self.growth = growth
+        self.shrink = shrink
+        self.history = []
+        self.given_up = []
+
+    def next_batch(self):
+        """Return the next batch to request, or None if the queue is empty."""
+        if self._requeued:
+            return self._requeued.pop()
+        if self._points:
+            n = min(self.size, len(self._points))
+            return [self._points.popleft() for _ in range(n)]
+        return None
+
+    def _worth_bisecting(self, node, msg, n):
+        """Whether a batch of n points that failed with non-size `msg` is split."""
+        if n <= self.min_size and not names_point(msg):
+            return False
+        # Stop once this split, or any split above it, failed on both halves
+        while node is not None:
+            if node["error"] == msg and node["sibling"]["error"] == msg:
+                return False
+            node = node["parent"]
+        return True
+
+    def _split(self, batch, node):
+        mid = len(batch) // 2
+        halves = [{"batch": batch[:mid], "parent": node, "error": None},
+                  {"batch": batch[mid:], "parent": node, "error": None}]
+        halves[0]["sibling"], halves[1]["sibling"] = halves[1], halves[0]
+        for half in reversed(halves):
+            self._splits[id(half["batch"])] = half
+            self._requeued.append(half["batch"])
+        return mid
+
+    def report(self, batch_id, batch, ok, elapsed_s, error=None, split=True):
+        """
+        Feed back the outcome of one batch. Returns "ok", "split" or "failed".
+        Raises RepeatedFailureError after `max_repeated_failures` consecutive
+        failures with the same non-size error.
+        """
+        node = self._splits.pop(id(batch), None)
+        msg = None if ok else str(error)
+        size_error = not ok and is_size_error(msg)
+        if node is not None:
+            node["error"] = msg
+        if ok:
+            status = "ok"
+            if elapsed_s < self.target_latency_s:
+                self.size = min(self.max_size, int(self.size * self.growth) + 1)
+            else:
+                self.size = max(self.min_size, int(self.size * self.shrink))
+        elif split and len(batch) > 1 and (
+            size_error or self._worth_bisecting(node, msg, len(batch))
+        ):
+            status = "split"
+            mid = self._split(batch, node)
+            if size_error:
+                self.size = max(self.min_size, mid)
+        else:
+            status = "failed"
+            self.given_up.extend(batch)
+        self.history.append({
+            "batch": batch_id,
+            "size": len(batch),
+            "status": status,
+            "elapsed_s": round(elapsed_s, 3),
+            "learned_size": self.size,
+        })
+
+        if ok:
+            self._last_failure, self._repeated_failures = None, 0
+        elif not size_error:
+            if msg == self._last_failure:
+                self._repeated_failures += 1
+            else:
+                self._last_failure, self._repeated_failures = msg, 1
+            if self._repeated_failures >= self.max_repeated_failures:
+                raise RepeatedFailureError(
+                    f"Aborting: {self._repeated_failures} consecutive batches failed "
+                    f"with the same error: {msg}"
+                )
+        return status
+
+    def summary(self):
+        """One-line description of the run's batching behaviour."""
+        n = len(self.history)
+        n_split = sum(1 for h in self.history if h["status"] == "split")
+        ok = [h for h in self.history if h["status"] == "ok"]
+        mean_ok = sum(h["size"] for h in ok) / len(ok) if ok else 0
+        mean_latency = sum(h["elapsed_s"] for h in ok) / len(ok) if ok else 0.0
+        err_rate = n_split / n * 100 if n else 0.0
+        return (f"{n} requests, {n_split} split ({err_rate:.1f}% error rate), "
+                f"mean ok batch {mean_ok:.0f} pts in {mean_latency:.2f}s, "
+                f"final size {self.size}, "
+                f"{len(self.given_up)} points given up")
+
+
+class _ListSource:
+    def __init__(self, batches):
+        self._iter = iter(batches)
+
+    def next_batch(self):
+        return next(self._iter, None)
+
+
+def dispatch_batches(batches, worker, max_in_flight=4, limiter=None):
+    """
+    Run `worker(batch)` for every batch with at most `max_in_flight` calls
+    running concurrently. If `limiter` is given, one token is acquired before
+    each call is started.
+
+    `batches` is either an iterable of batches or an object with a
+    `next_batch()` method (e.g. AdaptiveBatcher) that may return None while
+    nothing is queued. New batches are pulled only after the caller has
+    consumed a result, so feedback given in the loop body is seen in time.
+
+    Yields (batch_idx, batch, result, error, elapsed_s) as batches complete,
+    where batch_idx counts submissions. Exactly one of `result` / `error` is
+    None.
+    """
+    source = batches if hasattr(batches, "next_batch") else _ListSource(batches)
+    n_submitted = 0
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        in_flight = {}
+
+        def fill_slots():
+            nonlocal n_submitted
+            while len(in_flight) < max_in_flight:
+                batch = source.next_batch()
+                if batch is None:
+                    return
+                if limiter is not None:
+                    limiter.acquire()
+                fut = pool.submit(_timed_call, worker, batch)
+                in_flight[fut] = (n_submitted, batch)
+                n_submitted += 1
+
+        fill_slots()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                batch_idx, batch = in_flight.pop(fut)
+                result, error, elapsed = fut.result()
+                yield batch_idx, batch, result, error, elapsed
+            fill_slots()
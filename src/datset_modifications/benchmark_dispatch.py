@@ -0,0 +1,109 @@
+"""
+Benchmark sequential vs concurrent batch dispatch for embedding extraction.
+
+Runs `extract_embeddings.extract_batch` against the offline `fake_ee` module,
+which sleeps a fixed latency per getInfo() call, and compares:
+  - the original loop: one batch at a time with time.sleep(1) between batches
+  - dispatch_batches() at several in-flight limits under a token bucket
+
+No Earth Engine access or credentials are needed.
+"""
+
+import os
+import random
+import time
+
+import numpy as np
+
+os.environ["EE_BACKEND"] = "fake"
+
+import extract_embeddings as ex  # noqa: E402
+import fake_ee  # noqa: E402
+from batch_dispatch import TokenBucket, dispatch_batches  # noqa: E402
+
+# ── Configuration ──────────────────────────────────────────────────────────
+N_POINTS = 4000
+BATCH_SIZE = 250
+LATENCY_S = 0.5  # Simulated server latency per getInfo()
+THROTTLE_S = 1.0  # Sleep between batches in the sequential baseline
+IN_FLIGHT_LEVELS = [1, 2, 4, 8]
+REQUESTS_PER_SECOND = 8.0
+
+
+def make_points(n, seed=42):
+    """Random points inside the Arunachal Pradesh bounding box."""
+    rng = random.Random(seed)
+    return [
+        {"SNo": str(i + 1), "lat": rng.uniform(26.6, 29.5),
+         "lon": rng.uniform(91.5, 97.4)}
+        for i in range(n)
+    ]
+
+
+def batch_key(batch):
+    return tuple(p["SNo"] for p in batch)
+
+
+def run_sequential(batches, image):
+    """{batch SNos: float32 values} from one batch at a time."""
+    results = {}
+    for i, batch in enumerate(batches):
+        values, errors, _, _ = ex.extract_batch(batch, image)
+        if not errors:
+            results[batch_key(batch)] = values
+        if i < len(batches) - 1:
+            time.sleep(THROTTLE_S)
+    return results
+
+
+def run_concurrent(batches, image, in_flight):
+    """{batch SNos: float32 values} from dispatch_batches()."""
+    results = {}
+    limiter = TokenBucket(REQUESTS_PER_SECOND, burst=in_flight)
+    for _, batch, result, error, _ in dispatch_batches(
+        batches, lambda b: ex.extract_batch(b, image), in_flight, limiter
+    ):
+        if error is None and not result[1]:
+            results[batch_key(batch)] = result[0]
+    return results
+
+
+def same_results(a, b):
+    """True if both runs returned the same batches with identical values."""
+    return a.keys() == b.keys() and all(
+        np.array_equal(a[k], b[k], equal_nan=True) for k in a
+    )
+
+
+def main():
+    """Run the comparison; returns {in_flight: results identical to sequential}."""
+    fake_ee.configure(latency=LATENCY_S)
+    points = make_points(N_POINTS)
+    batches = [points[i:i + BATCH_SIZE] for i in range(0, len(points), BATCH_SIZE)]
+    image = ex.build_sampling_image()
+    print(f"{N_POINTS:,} points, {len(batches)} batches of {BATCH_SIZE}, "
+          f"{LATENCY_S}s latency per request\n")
+
+    fake_ee.configure()
+    t0 = time.time()
+    reference = run_sequential(batches, image)
+    base_s = time.time() - t0
+    print(f"  {'sequential + sleep(1)':<24} {base_s:7.2f}s  "
+          f"{N_POINTS / base_s:8.0f} pts/s  requests={fake_ee.REQUEST_COUNT}")
+
+    identical = {}
+    for in_flight in IN_FLIGHT_LEVELS:
+        fake_ee.configure()
+        t0 = time.time()
+        results = run_concurrent(batches, image, in_flight)
+        elapsed = time.time() - t0
+        identical[in_flight] = same_results(results, reference)
+        same = "identical" if identical[in_flight] else "MISMATCH"
+        print(f"  {f'concurrent x{in_flight}':<24} {elapsed:7.2f}s  "
+              f"{N_POINTS / elapsed:8.0f} pts/s  requests={fake_ee.REQUEST_COUNT}  "
+              f"speedup={base_s / elapsed:4.1f}x  ({same})")
+    return identical
+
+
+if __name__ == "__main__":
+    main()
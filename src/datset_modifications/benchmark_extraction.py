@@ -0,0 +1,214 @@
+"""
+End-to-end extraction benchmark against the offline fake Earth Engine backend.
+
+Writes a synthetic dataset_1_binned.csv into a temporary directory, points the
+extraction scripts at it and times complete runs of:
+  - extract_embeddings.main  cold (empty pixel cache)
+  - extract_embeddings.main  warm (--full: pixel cache only)
+  - extract_embeddings.main  with injected transient failures and bad points
+  - extract_embeddings.main  incremental, after moving 1% of the points
+  - extract_embeddings.main  --sampler local, on synthetic exported tiles
+  - extract_multisource_features.main
+  - batch latency with points in input order vs Hilbert / Z-order, with a
+    simulated per-tile cost so scattered batches are slower
+  - local tile sampling: values checked against the synthetic tile function,
+    reply layout checked against the Earth Engine samplers, and points/second
+    with 1 vs LOCAL_TILE_WORKERS threads
+
+Each scenario reports wall time, Earth Engine requests and points returned,
+so batching, concurrency and caching changes can be compared without network
+access or credentials.
+"""
+
+import contextlib
+import csv
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ["EE_BACKEND"] = "fake"
+
+import extract_embeddings as ex  # noqa: E402
+import extract_multisource_features as ms  # noqa: E402
+import fake_ee  # noqa: E402
+from ee_sampling import LOCAL_METHOD, sample_points  # noqa: E402
+from local_raster import (  # noqa: E402
+    LOCAL_TILE_WORKERS, TileSet, make_synthetic_tiles, synthetic_value,
+)
+from pixel_grid import POINT_ORDERS, spatial_order  # noqa: E402
+
+# ── Configuration ──────────────────────────────────────────────────────────
+N_POINTS = 20000
+DUPLICATE_EVERY = 10  # Every Nth point repeats the previous coordinate
+LATENCY_S = 0.5
+BATCH_SIZE = 1000
+REQUESTS_PER_SECOND = 20.0
+TILE_LATENCY_S = 0.005  # Per distinct tile in a request (ordering scenario)
+ORDER_BATCHES = 5  # Batches timed per point order
+TILE_PIXEL_DEG = 0.01  # Synthetic tile pixel size (~1 km keeps the set small)
+TILE_PX = 128  # Synthetic tile width/height in pixels
+LOCAL_POINTS = 200000  # Points sampled in the local throughput comparison
+VERBOSE = False  # Show the scripts' own per-batch output
+
+
+def write_points(path, n, seed=7):
+    rng = random.Random(seed)
+    prev = None
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["SNo", "lat", "lon", "label", "class description", "bin"])
+        for i in range(n):
+            if prev and i % DUPLICATE_EVERY == 0:
+                lat, lon = prev
+            else:
+                lat, lon = rng.uniform(26.6, 29.5), rng.uniform(91.5, 97.4)
+            prev = (lat, lon)
+            writer.writerow([i + 1, lat, lon, "101", "", rng.choice(["Forest", "Water"])])
+
+
+def move_points(path, every=100, shift_deg=0.01):
+    """Shift the latitude of every `every`-th point, as a re-binning might."""
+    with open(path, "r", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    for i, row in enumerate(rows[1:]):
+        if i % every == 0:
+            row[1] = str(float(row[1]) + shift_deg)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+
+
+def point_script_at(module, tmp_dir, input_path):
+    """Redirect a script's input/output paths into the temporary directory."""
+    module.BASE = tmp_dir
+    module.INPUT_PATH = input_path
+    module.BATCH_SIZE = BATCH_SIZE
+    module.REQUESTS_PER_SECOND = REQUESTS_PER_SECOND
+    module.RETRY_BASE_DELAY_S = 0.05
+    for name in dir(module):
+        value = getattr(module, name)
+        if name.endswith("_PATH") and name != "INPUT_PATH" and isinstance(value, str):
+            setattr(module, name, os.path.join(tmp_dir, os.path.basename(value.replace("\\", "/"))))
+
+
+def run(label, main, argv=(), failure_rate=0.0, fail_snos=()):
+    fake_ee.configure(latency=LATENCY_S, failure_rate=failure_rate, fail_snos=fail_snos)
+    sys.argv = ["benchmark"] + list(argv)
+    out = io.StringIO()
+    t0 = time.time()
+    with contextlib.redirect_stdout(sys.stdout if VERBOSE else out):
+        main()
+    elapsed = time.time() - t0
+    print(f"  {label:<34} {elapsed:8.2f}s  requests={fake_ee.REQUEST_COUNT:<5} "
+          f"features returned={fake_ee.FEATURES_RETURNED:,}")
+
+
+def compare_point_orders(input_path):
+    """Time the same batches cut from each point order, sequentially."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        points = ex.load_points(input_path)
+        image = ex.build_sampling_image()
+    fake_ee.configure(latency=LATENCY_S, tile_latency=TILE_LATENCY_S)
+    print(f"\nBatch latency by point order ({ORDER_BATCHES} x {BATCH_SIZE} points, "
+          f"+{TILE_LATENCY_S}s per {fake_ee.TILE_DEG} deg tile):")
+    for order in POINT_ORDERS:
+        ordered = spatial_order(points, order)
+        latencies = []
+        for i in range(ORDER_BATCHES):
+            batch = ordered[i * BATCH_SIZE:(i + 1) * BATCH_SIZE]
+            t0 = time.time()
+            sample_points(batch, image, ex.SAMPLING_METHOD)
+            latencies.append(time.time() - t0)
+        print(f"  {order:<8} mean {sum(latencies) / len(latencies):6.2f}s  "
+              f"max {max(latencies):6.2f}s")
+    fake_ee.configure(tile_latency=0.0)
+
+
+def write_tiles(tile_dir, input_path):
+    """Synthetic embedding tiles plus an overlapping coarser DEM layer."""
+    points = ex.load_points(input_path)
+    lats = [p["lat"] for p in points]
+    lons = [p["lon"] for p in points]
+    bounds = (min(lons), min(lats), max(lons) + 1e-6, max(lats) + 1e-6)
+    make_synthetic_tiles(tile_dir, bounds, ex.EMBEDDING_BANDS, TILE_PX, TILE_PIXEL_DEG)
+    make_synthetic_tiles(tile_dir, bounds, ["elevation"], TILE_PX, 3 * TILE_PIXEL_DEG,
+                         prefix="dem")
+    return bounds
+
+
+def compare_local_sampling(tile_dir, bounds):
+    """Check local values and reply layout, then time 1 vs N gather threads."""
+    rng = random.Random(3)
+    min_lon, min_lat, max_lon, max_lat = bounds
+    points = [{"SNo": str(i + 1), "lat": rng.uniform(min_lat, max_lat),
+               "lon": rng.uniform(min_lon, max_lon)} for i in range(LOCAL_POINTS)]
+    tiles = TileSet(tile_dir, LOCAL_TILE_WORKERS)
+    print(f"\nLocal tiles: {tiles.summary()}")
+
+    # Values: the pixel centre of each point, nodata rows left blank
+    sample = points[:1000]
+    values = tiles.sample([p["lat"] for p in sample], [p["lon"] for p in sample],
+                          ex.EMBEDDING_BANDS[:2])
+    mismatches = 0
+    for p, row in zip(sample, values):
+        col = int((p["lon"] - min_lon) // TILE_PIXEL_DEG)
+        r = int((max_lat - p["lat"]) // TILE_PIXEL_DEG)
+        if r % TILE_PX == TILE_PX - 1:
+            mismatches += not all(v != v for v in row)  # nodata -> NaN
+            continue
+        lat = max_lat - (r + 0.5) * TILE_PIXEL_DEG
+        lon = min_lon + (col + 0.5) * TILE_PIXEL_DEG
+        expected = [synthetic_value(b, lat, lon) for b in range(2)]
+        mismatches += any(abs(v - e) > 1e-3 for v, e in zip(row, expected))
+    print(f"  values vs synthetic tiles: {mismatches} mismatches in {len(sample)} points")
+
+    # Layout: same feature keys as an Earth Engine reply for the same bands
+    bands = ex.EMBEDDING_BANDS + ex.CLOUD_COLUMNS
+    fake_ee.configure(latency=0.0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        image = ex.build_sampling_image()
+    remote = sample_points(sample[:5], image, ex.SAMPLING_METHOD, bands)["features"]
+    local = sample_points(sample[:5], tiles, LOCAL_METHOD, bands)["features"]
+    same = all(sorted(a["properties"]) == sorted(b["properties"])
+               for a, b in zip(remote, local))
+    print(f"  reply layout matches the EE samplers: {same}")
+
+    lats = [p["lat"] for p in points]
+    lons = [p["lon"] for p in points]
+    for workers in sorted({1, LOCAL_TILE_WORKERS}):
+        tiles.max_workers = workers
+        t0 = time.time()
+        tiles.sample(lats, lons, ex.EMBEDDING_BANDS + ["elevation"])
+        elapsed = time.time() - t0
+        print(f"  {workers:>2} thread(s): {LOCAL_POINTS:,} points x 65 bands in "
+              f"{elapsed:6.2f}s ({LOCAL_POINTS / elapsed:,.0f} pts/s)")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, "dataset_1_binned.csv")
+        write_points(input_path, N_POINTS)
+        point_script_at(ex, tmp_dir, input_path)
+        point_script_at(ms, tmp_dir, input_path)
+        print(f"{N_POINTS:,} synthetic points, {LATENCY_S}s simulated latency\n")
+
+        run("embeddings: cold", ex.main)
+        run("embeddings: warm pixel cache", ex.main, ["--full"])
+        os.remove(ex.CACHE_PATH)
+        run("embeddings: 10% failures + bad SNo", ex.main, ["--full"],
+            failure_rate=0.1, fail_snos=["123"])
+        move_points(input_path)
+        run("embeddings: incremental, 1% moved", ex.main)
+        tile_dir = os.path.join(tmp_dir, "tiles")
+        bounds = write_tiles(tile_dir, input_path)
+        run("embeddings: local tiles", ex.main,
+            ["--full", "--sampler", LOCAL_METHOD, "--tiles", tile_dir])
+        run("multisource", ms.main)
+        compare_point_orders(input_path)
+        compare_local_sampling(tile_dir, bounds)
+
+
+if __name__ == "__main__":
+    main()
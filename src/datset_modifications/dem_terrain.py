@@ -0,0 +1,487 @@
+"""
+Local terrain derivatives from a NASADEM raster: elevation, slope, aspect,
+TPI, TWI and SPI, sampled at the Dataset 1 points.
+
+Earth Engine's ee.Terrain only gives slope and aspect (get_dem_features in
+extract_multisource_features.py). TWI and SPI need upslope contributing area,
+i.e. flow accumulation over the whole drainage network, so this script works
+on the exported DEM locally with NumPy instead.
+
+The DEM is processed in TILE_SIZE x TILE_SIZE tiles on a process pool, so
+memory is bounded by a few tiles regardless of the AOI size:
+
+  Pass 1 (per tile, halo of TPI_RADIUS_PX cells): slope and aspect (Horn
+    3x3), TPI (elevation minus the mean of the surrounding square window),
+    D8 flow directions and flow accumulation inside the tile. Each tile
+    returns the flow that leaves it and, for every edge cell, where flow
+    entering there leaves the tile again.
+  Join (main process): the tile-to-tile links are accumulated in downstream
+    order, giving the exact flow entering every tile from upstream tiles.
+  Pass 2 (per tile, halo of 1 cell): flow accumulation again, seeded with
+    that inflow, then TWI = ln(a / tan b) and SPI = a * tan b, where a is the
+    specific catchment area (upslope area / cell width, m) and b the slope.
+
+Flow accumulation is therefore identical to an untiled run (--benchmark
+checks this). The DEM is not depression-filled: pits and flats end a flow path.
+
+The result is one (rows, cols, 6) float32 .npy + .json raster in the
+local_raster tile format, sampled at the points with local_raster.TileSet.
+The DEM may be a .npy + .json tile, a GeoTIFF or a .vrt mosaic of exported
+GeoTIFFs (the latter two need rasterio). --benchmark N runs the engine on a
+synthetic N x N DEM and reports throughput and peak memory instead.
+
+Outputs:
+  - raw_data/terrain/nasadem_terrain.npy (+ .json)  (float32 (rows, cols, 6))
+  - raw_data/dataset_1/dataset_1_terrain.csv  (SNo, lat, lon + 6 terrain columns)
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from local_raster import TileSet, open_tile
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+# ── Configuration ──────────────────────────────────────────────────────────
+BASE = r"c:\Users\Kdixter\Desktop\GIS_Analysis_Final\raw_data\dataset_1"
+INPUT_PATH = os.path.join(BASE, "dataset_1_binned.csv")
+OUTPUT_PATH = os.path.join(BASE, "dataset_1_terrain.csv")
+DEM_PATH = os.path.join(os.path.dirname(BASE), "tiles", "nasadem.vrt")
+TERRAIN_DIR = os.path.join(os.path.dirname(BASE), "terrain")
+TERRAIN_NAME = "nasadem_terrain"
+
+TERRAIN_BANDS = ["elevation", "slope", "aspect", "tpi", "twi", "spi"]
+TILE_SIZE = 1024  # Tile interior in cells (~30 km of 1 arc-second NASADEM)
+TPI_RADIUS_PX = 10  # TPI window is (2r + 1)^2 cells, ~630 m at 30 m
+MIN_SLOPE_DEG = 0.1  # Floor for tan(slope) in TWI / SPI on flats
+TERRAIN_WORKERS = os.cpu_count() or 4
+BENCHMARK_CHECK_MAX = 4096  # Benchmark DEMs up to this size are also run untiled
+
+M_PER_DEG_LAT = 110574.0
+M_PER_DEG_LON = 111320.0  # At the equator, times cos(lat)
+
+# D8 neighbour offsets (row, col)
+D8_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+# ── Geometry ───────────────────────────────────────────────────────────────
+def cell_size(meta, row0, row1):
+    """Cell width (per row, array) and height in metres for rows [row0, row1)."""
+    a, b, _, d, e, f = meta["transform"]
+    if b or d:
+        raise ValueError("Terrain derivatives need a north-up DEM (no rotation)")
+    if str(meta["crs"]).upper() in ("EPSG:4326", "4326"):
+        lat = f + e * (np.arange(row0, row1) + 0.5)
+        dx = abs(a) * M_PER_DEG_LON * np.cos(np.radians(lat))
+        return dx, abs(e) * M_PER_DEG_LAT
+    return np.full(row1 - row0, abs(a)), abs(e)
+
+
+def read_padded(tile, shape, row0, row1, col0, col1, halo):
+    """DEM window [row0, row1) x [col0, col1) plus `halo` cells, NaN outside the raster."""
+    rows, cols = shape
+    r0, r1 = max(row0 - halo, 0), min(row1 + halo, rows)
+    c0, c1 = max(col0 - halo, 0), min(col1 + halo, cols)
+    z = np.full((row1 - row0 + 2 * halo, col1 - col0 + 2 * halo), np.nan)
+    z[r0 - row0 + halo:r1 - row0 + halo, c0 - col0 + halo:c1 - col0 + halo] = (
+        tile.window(r0, r1, c0, c1)[:, :, 0])
+    return z
+
+
+def _shifted(z, halo, di, dj):
+    """View of the padded array z offset by (di, dj) over the tile interior."""
+    h, w = z.shape[0] - 2 * halo, z.shape[1] - 2 * halo
+    return z[halo + di:halo + di + h, halo + dj:halo + dj + w]
+
+
+def slope_aspect(z, halo, dx, dy):
+    """Horn (1981) slope (deg) and aspect (deg clockwise from north, -1 on flats)."""
+    n = {off: _shifted(z, halo, *off) for off in D8_OFFSETS}
+    dzdx = ((n[(-1, 1)] + 2 * n[(0, 1)] + n[(1, 1)])
+            - (n[(-1, -1)] + 2 * n[(0, -1)] + n[(1, -1)])) / (8 * dx[:, None])
+    dzds = ((n[(1, -1)] + 2 * n[(1, 0)] + n[(1, 1)])
+            - (n[(-1, -1)] + 2 * n[(-1, 0)] + n[(-1, 1)])) / (8 * dy)  # Southward
+    slope = np.degrees(np.arctan(np.hypot(dzdx, dzds)))
+    aspect = np.degrees(np.arctan2(-dzdx, dzds)) % 360  # Downslope bearing
+    aspect[(dzdx == 0) & (dzds == 0)] = -1
+    return slope, aspect
+
+
+def tpi(z, halo, radius):
+    """Elevation minus the mean of the (2r + 1)^2 window around each cell."""
+    filled = np.nan_to_num(z)
+    valid = (~np.isnan(z)).astype(np.float64)
+    h, w = z.shape[0] - 2 * halo, z.shape[1] - 2 * halo
+    sums = []
+    for arr in (filled, valid):
+        sat = np.zeros((arr.shape[0] + 1, arr.shape[1] + 1))
+        sat[1:, 1:] = arr.cumsum(0).cumsum(1)
+        r0, c0 = halo - radius, halo - radius
+        k = 2 * radius + 1
+        sums.append(sat[r0 + k:r0 + k + h, c0 + k:c0 + k + w]
+                    - sat[r0:r0 + h, c0 + k:c0 + k + w]
+                    - sat[r0 + k:r0 + k + h, c0:c0 + w]
+                    + sat[r0:r0 + h, c0:c0 + w])
+    centre = _shifted(z, halo, 0, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (sums[0] - np.nan_to_num(centre)) / (sums[1] - 1)
+    return centre - mean
+
+
+def d8_downstream(z, dx, dy):
+    """
+    Steepest-descent neighbour of every interior cell of a 1-cell padded DEM.
+    Returns (di, dj) int8 arrays; (0, 0) where no neighbour is lower.
+    """
+    centre = _shifted(z, 1, 0, 0)
+    best = np.zeros(centre.shape)
+    di = np.zeros(centre.shape, dtype=np.int8)
+    dj = np.zeros(centre.shape, dtype=np.int8)
+    dx = dx[:, None]
+    for oi, oj in D8_OFFSETS:
+        dist = np.hypot(dx * oj, dy * oi) if oi and oj else (dx if oj else dy)
+        with np.errstate(invalid="ignore"):
+            drop = np.nan_to_num((centre - _shifted(z, 1, oi, oj)) / dist, nan=-np.inf)
+        better = drop > best
+        best[better] = drop[better]
+        di[better] = oi
+        dj[better] = oj
+    di[np.isnan(centre)] = 0
+    dj[np.isnan(centre)] = 0
+    return di, dj
+
+
+def accumulate(down, weights):
+    """
+    Sum `weights` downstream along `down` (index of each node's receiver,
+    -1 for none), one vectorised wave of ready nodes at a time.
+    """
+    acc = np.array(weights, dtype=np.float64)
+    has_down = down >= 0
+    indeg = np.bincount(down[has_down], minlength=len(down))
+    frontier = np.flatnonzero(indeg == 0)
+    while frontier.size:
+        d = down[frontier]
+        m = d >= 0
+        src, d = frontier[m], d[m]
+        np.add.at(acc, d, acc[src])
+        np.subtract.at(indeg, d, 1)
+        frontier = np.unique(d[indeg[d] == 0])
+    return acc
+
+
+# ── Tile passes (run in worker processes) ──────────────────────────────────
+def _tile_flow(tile, meta, shape, window):
+    """Padded DEM, cell sizes and in-tile / leaving flow links of one tile."""
+    row0, row1, col0, col1 = window
+    z = read_padded(tile, shape, row0, row1, col0, col1, 1)
+    dx, dy = cell_size(meta, row0, row1)
+    di, dj = d8_downstream(z, dx, dy)
+    h, w = row1 - row0, col1 - col0
+    ii, jj = np.indices((h, w))
+    ti, tj = ii + di, jj + dj
+    flows = (di != 0) | (dj != 0)
+    inside = flows & (ti >= 0) & (ti < h) & (tj >= 0) & (tj < w)
+    down = np.where(inside, ti * w + tj, -1).ravel()
+    leaves = (flows & ~inside).ravel()
+    target = ((row0 + ti) * shape[1] + (col0 + tj)).ravel()  # Global receiver
+    area = np.where(np.isnan(_shifted(z, 1, 0, 0)), 0.0, (dx * dy)[:, None])
+    return z, dx, down, leaves, target, area.ravel()
+
+
+def _edge_cells(h, w):
+    """Local flat indices of the cells on the tile border."""
+    mask = np.zeros((h, w), dtype=bool)
+    mask[0], mask[-1], mask[:, 0], mask[:, -1] = True, True, True, True
+    return np.flatnonzero(mask)
+
+
+def terrain_pass1(job):
+    """Slope, aspect, TPI into the output; returns the tile's flow links."""
+    dem_path, out_path, meta, shape, window, radius = job
+    tracemalloc.start()
+    row0, row1, col0, col1 = window
+    tile = open_tile(dem_path)
+    z = read_padded(tile, shape, row0, row1, col0, col1, max(radius, 1))
+    dx, dy = cell_size(meta, row0, row1)
+    halo = max(radius, 1)
+    slope, aspect = slope_aspect(z[halo - 1:z.shape[0] - halo + 1,
+                                   halo - 1:z.shape[1] - halo + 1], 1, dx, dy)
+    out = np.load(out_path, mmap_mode="r+")
+    out[row0:row1, col0:col1, 0] = _shifted(z, halo, 0, 0)
+    out[row0:row1, col0:col1, 1] = slope
+    out[row0:row1, col0:col1, 2] = aspect
+    out[row0:row1, col0:col1, 3] = tpi(z, halo, radius)
+    out.flush()
+    del out, z
+
+    _, _, down, leaves, target, area = _tile_flow(tile, meta, shape, window)
+    acc = accumulate(down, area)
+
+    # Where flow entering at each edge cell leaves the tile (pointer jumping)
+    w = col1 - col0
+    reach = np.where(down >= 0, down, np.arange(len(down)))
+    while True:
+        nxt = reach[reach]
+        if np.array_equal(nxt, reach):
+            break
+        reach = nxt
+    edge = _edge_cells(row1 - row0, w)
+    end = reach[edge]
+
+    def to_global(local):
+        return (row0 + local // w) * shape[1] + col0 + local % w
+
+    out_src = np.flatnonzero(leaves)
+    result = {
+        "src": to_global(out_src),
+        "target": target[out_src],
+        "amount": acc[out_src],
+        "edge": to_global(edge),
+        "edge_exit": np.where(leaves[end], to_global(end), -1),
+        "peak_bytes": tracemalloc.get_traced_memory()[1],
+    }
+    tracemalloc.stop()
+    return result
+
+
+def terrain_pass2(job):
+    """Flow accumulation seeded with upstream inflow, then TWI and SPI."""
+    dem_path, out_path, meta, shape, window, inflow_cells, inflow = job
+    tracemalloc.start()
+    row0, row1, col0, col1 = window
+    tile = open_tile(dem_path)
+    z, dx, down, _, _, area = _tile_flow(tile, meta, shape, window)
+    np.add.at(area, inflow_cells, inflow)
+    acc = accumulate(down, area).reshape(row1 - row0, col1 - col0)
+    dy = cell_size(meta, row0, row1)[1]
+    slope, _ = slope_aspect(z, 1, dx, dy)
+    tan_b = np.maximum(np.tan(np.radians(slope)), math.tan(math.radians(MIN_SLOPE_DEG)))
+    a = acc / dx[:, None]  # Specific catchment area (m)
+    out = np.load(out_path, mmap_mode="r+")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[row0:row1, col0:col1, 4] = np.log(a / tan_b)
+        out[row0:row1, col0:col1, 5] = a * tan_b
+    nodata = np.isnan(_shifted(z, 1, 0, 0))
+    out[row0:row1, col0:col1, 4][nodata] = np.nan
+    out[row0:row1, col0:col1, 5][nodata] = np.nan
+    out.flush()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+# ── Scheduler ──────────────────────────────────────────────────────────────
+def resolve_inflow(links, shape, tile_size):
+    """
+    Accumulate the tile-to-tile flow links in downstream order.
+    Returns {tile window origin (row0, col0): (global cells, inflow)}.
+    """
+    src = np.concatenate([r["src"] for r in links])
+    target = np.concatenate([r["target"] for r in links])
+    amount = np.concatenate([r["amount"] for r in links])
+    edge = np.concatenate([r["edge"] for r in links])
+    edge_exit = np.concatenate([r["edge_exit"] for r in links])
+
+    # Link k feeds the link leaving the receiving tile from exit(target[k])
+    order = np.argsort(edge)
+    pos = order[np.searchsorted(edge, target, sorter=order)]
+    exit_cell = edge_exit[pos]
+    src_order = np.argsort(src)
+    nxt = np.full(len(src), -1, dtype=np.int64)
+    has_exit = exit_cell >= 0
+    nxt[has_exit] = src_order[np.searchsorted(src, exit_cell[has_exit], sorter=src_order)]
+    total = accumulate(nxt, amount)
+
+    rows, cols = target // shape[1], target % shape[1]
+    tile_id = (rows // tile_size) * shape[1] + cols // tile_size
+    inflow = {}
+    for tid in np.unique(tile_id):
+        m = tile_id == tid
+        key = ((tid // shape[1]) * tile_size, (tid % shape[1]) * tile_size)
+        inflow[key] = (target[m], total[m])
+    return inflow
+
+
+def tile_windows(shape, tile_size):
+    rows, cols = shape
+    return [(r, min(r + tile_size, rows), c, min(c + tile_size, cols))
+            for r in range(0, rows, tile_size) for c in range(0, cols, tile_size)]
+
+
+def compute_terrain(dem_path, out_dir, tile_size=TILE_SIZE, workers=TERRAIN_WORKERS,
+                    radius=TPI_RADIUS_PX, name=TERRAIN_NAME):
+    """
+    Write the six-band terrain raster for a DEM into out_dir.
+    Returns (terrain .npy path, stats dict).
+    """
+    dem = open_tile(dem_path)
+    meta = {"crs": dem.crs, "transform": list(dem.transform)}
+    shape = tuple(int(s) for s in dem.shape)
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, name + ".npy")
+    out = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.float32,
+                                    shape=shape + (len(TERRAIN_BANDS),))
+    del out
+    with open(os.path.join(out_dir, name + ".json"), "w", encoding="utf-8") as f:
+        json.dump(dict(meta, bands=TERRAIN_BANDS, nodata=None), f)
+
+    windows = tile_windows(shape, tile_size)
+    t0 = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        links = list(pool.map(terrain_pass1, [
+            (dem_path, out_path, meta, shape, w, radius) for w in windows
+        ]))
+        t1 = time.time()
+        inflow = resolve_inflow(links, shape, tile_size)
+        t2 = time.time()
+        jobs = []
+        for w in windows:
+            cells, amount = inflow.get((w[0], w[2]), (np.empty(0, np.int64), np.empty(0)))
+            local = (cells // shape[1] - w[0]) * (w[3] - w[2]) + cells % shape[1] - w[2]
+            jobs.append((dem_path, out_path, meta, shape, w, local, amount))
+        peaks = list(pool.map(terrain_pass2, jobs))
+    t3 = time.time()
+
+    cells = shape[0] * shape[1]
+    stats = {
+        "cells": cells,
+        "tiles": len(windows),
+        "workers": workers,
+        "pass1_s": t1 - t0,
+        "join_s": t2 - t1,
+        "pass2_s": t3 - t2,
+        "mcells_per_s": cells / 1e6 / (t3 - t0),
+        "links": int(sum(len(r["src"]) for r in links)),
+        "tile_peak_mb": max([r["peak_bytes"] for r in links] + peaks) / 1e6,
+    }
+    return out_path, stats
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process and its finished workers (None on Windows)."""
+    if resource is None:
+        return None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024  # ru_maxrss is in KB on Linux
+
+
+def report(stats, label):
+    rss = peak_rss_mb()
+    print(f"{label}: {stats['cells'] / 1e6:,.1f} M cells in {stats['tiles']} tiles, "
+          f"{stats['workers']} workers | pass 1 {stats['pass1_s']:.1f}s, join "
+          f"{stats['join_s']:.2f}s ({stats['links']:,} links), pass 2 "
+          f"{stats['pass2_s']:.1f}s -> {stats['mcells_per_s']:.2f} M cells/s | "
+          f"peak tile arrays {stats['tile_peak_mb']:.0f} MB"
+          + (f", peak RSS {rss:.0f} MB" if rss is not None else ""))
+
+
+# ── Points ─────────────────────────────────────────────────────────────────
+def load_points(path):
+    """Load binned CSV points."""
+    points = []
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                points.append({"SNo": row["SNo"], "lat": float(row["lat"]),
+                               "lon": float(row["lon"])})
+            except (ValueError, KeyError):
+                pass
+    return points
+
+
+def write_point_terrain(points, terrain_dir, path):
+    """Sample the terrain raster at every point and write one CSV row per point."""
+    values = TileSet(terrain_dir).sample([p["lat"] for p in points],
+                                         [p["lon"] for p in points], TERRAIN_BANDS)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["SNo", "lat", "lon"] + TERRAIN_BANDS)
+        for p, row in zip(points, values.tolist()):
+            writer.writerow([p["SNo"], p["lat"], p["lon"]]
+                            + ["" if math.isnan(v) else f"{v:.6g}" for v in row])
+    return int((~np.isnan(values).all(axis=1)).sum())
+
+
+# ── Benchmark ──────────────────────────────────────────────────────────────
+def synthetic_dem(directory, size, seed=0):
+    """size x size synthetic 1 arc-second DEM (ridges, valleys, noise) as a local tile."""
+    rng = np.random.default_rng(seed)
+    path = os.path.join(directory, "dem.npy")
+    dem = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(size, size, 1))
+    x = np.linspace(0, 6 * np.pi, size)
+    for r0 in range(0, size, 1024):
+        y = x[r0:r0 + 1024, None]
+        dem[r0:r0 + 1024, :, 0] = (
+            2000 + 800 * np.sin(x[None, :] * 0.7) * np.cos(y * 0.5)
+            + 300 * np.sin(x[None, :] * 2.3 + y * 1.7) - 40 * y
+            + rng.normal(0, 2, (len(y), size))
+        )
+    dem.flush()
+    deg = 1 / 3600
+    with open(os.path.join(directory, "dem.json"), "w", encoding="utf-8") as f:
+        json.dump({"crs": "EPSG:4326", "transform": [deg, 0, 92.0, 0, -deg, 28.5],
+                   "bands": ["elevation"], "nodata": None}, f)
+    return path
+
+
+def benchmark(size, tile_size, workers):
+    """Throughput / memory on a synthetic DEM, and a tiled-vs-untiled check."""
+    with tempfile.TemporaryDirectory() as tmp:
+        dem_path = synthetic_dem(tmp, size)
+        print(f"Synthetic DEM: {size:,} x {size:,} cells")
+        path, stats = compute_terrain(dem_path, os.path.join(tmp, "tiled"),
+                                      tile_size, workers)
+        report(stats, f"Tiled ({tile_size} px)")
+        if size <= BENCHMARK_CHECK_MAX:
+            ref, ref_stats = compute_terrain(dem_path, os.path.join(tmp, "single"),
+                                             size, 1)
+            report(ref_stats, "Untiled reference")
+            a, b = np.load(path, mmap_mode="r"), np.load(ref, mmap_mode="r")
+            for i, band in enumerate(TERRAIN_BANDS):
+                diff = np.nanmax(np.abs(a[:, :, i] - b[:, :, i]))
+                print(f"  {band:<10} max |tiled - untiled| = {diff:.3g}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dem", default=DEM_PATH,
+                        help="DEM raster (.npy + .json, .tif or .vrt)")
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE)
+    parser.add_argument("--workers", type=int, default=TERRAIN_WORKERS)
+    parser.add_argument("--benchmark", type=int, metavar="N", default=0,
+                        help="Run on a synthetic N x N DEM, report throughput and "
+                             "peak memory, and exit")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.benchmark:
+        benchmark(args.benchmark, args.tile_size, args.workers)
+        return
+
+    print(f"Computing terrain derivatives from {args.dem}...")
+    _, stats = compute_terrain(args.dem, TERRAIN_DIR, args.tile_size, args.workers)
+    report(stats, "Terrain")
+
+    points = load_points(INPUT_PATH)
+    with_data = write_point_terrain(points, TERRAIN_DIR, OUTPUT_PATH)
+    print(f"Sampled {len(points):,} points ({with_data:,} inside the DEM) -> {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
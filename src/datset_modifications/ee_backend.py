@@ -0,0 +1,22 @@
+"""
+Select the Earth Engine implementation used by the extraction scripts.
+
+    from ee_backend import ee
+
+gives the real `earthengine-api` module by default. Setting the environment
+variable EE_BACKEND=fake swaps in the offline fake_ee module (deterministic
+synthetic values, configurable latency / payload limit / failures), so the
+batching, concurrency and caching code can run without network access or
+credentials. The variable must be set before the first import.
+"""
+
+import os
+
+EE_BACKEND = os.environ.get("EE_BACKEND", "earthengine").lower()
+
+if EE_BACKEND == "fake":
+    import fake_ee as ee  # noqa: F401
+elif EE_BACKEND == "earthengine":
+    import ee  # noqa: F401
+else:
+    raise ValueError(f"Unknown EE_BACKEND {EE_BACKEND!r}; expected 'earthengine' or 'fake'")
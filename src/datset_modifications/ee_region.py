@@ -0,0 +1,64 @@
+"""
+Region bounds for Earth Engine image graphs.
+
+Without bounds, `.mosaic()` / `.median()` / joins are defined over every scene
+on the planet in the date window, and Earth Engine has to plan (and often
+touch) far more imagery than the points need. study_area() turns the points
+into a buffered lat/lon rectangle; the extraction scripts pass it to
+`filterBounds` on every collection and `clip` the final composites to it, so
+server-side work scales with the study area.
+
+collection_sizes() fetches the scene count of several collections in one
+request, so each run can report how much imagery its mosaics and joins cover.
+"""
+
+from ee_backend import ee
+
+AOI_BUFFER_DEG = 0.05  # ~5 km margin around the outermost points
+
+
+def bounding_box(points, buffer_deg=AOI_BUFFER_DEG):
+    """(min_lon, min_lat, max_lon, max_lat) of the points plus a margin."""
+    lats = [p["lat"] for p in points]
+    lons = [p["lon"] for p in points]
+    return (min(lons) - buffer_deg, min(lats) - buffer_deg,
+            max(lons) + buffer_deg, max(lats) + buffer_deg)
+
+
+def study_area(points, buffer_deg=AOI_BUFFER_DEG):
+    """ee.Geometry.Rectangle covering every point (None if there are none)."""
+    if not points:
+        return None
+    return ee.Geometry.Rectangle(list(bounding_box(points, buffer_deg)))
+
+
+def bounded(collection, region):
+    """filterBounds(region), or the collection unchanged if region is None."""
+    return collection if region is None else collection.filterBounds(region)
+
+
+def clipped(image, region):
+    """clip(region), or the image unchanged if region is None."""
+    return image if region is None else image.clip(region)
+
+
+def collection_sizes(collections):
+    """{name: number of images} for {name: collection}, in a single request."""
+    if not collections:
+        return {}
+    return ee.Dictionary({
+        name: col.size() for name, col in collections.items()
+    }).getInfo()
+
+
+def report_collection_sizes(collections):
+    """Print the scene count behind each mosaic / join of a run."""
+    try:
+        sizes = collection_sizes(collections)
+    except Exception as e:
+        print(f"  Could not fetch collection sizes: {e}")
+        return {}
+    print("Collection sizes:")
+    for name in collections:
+        print(f"  {name:<32} {sizes.get(name, 0):>8,} images")
+    return sizes
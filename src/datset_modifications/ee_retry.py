@@ -0,0 +1,119 @@
+"""
+Retry layer for Earth Engine calls, plus a dead-letter file of failed points.
+
+Transient errors (quota, HTTP 429 / 5xx, dropped connections) are retried
+with exponential backoff and full jitter. Timeouts and other size errors
+(see batch_dispatch.is_size_error) are raised at once: resending the same
+batch would fail the same way, so the caller bisects it instead. A RetryBudget shared
+by all worker threads caps the total number of retries in a run, so a long
+outage fails fast instead of sleeping forever. Anything that still fails is
+raised to the caller.
+
+Points that cannot be extracted are written to a dead-letter CSV
+(SNo, lat, lon, error) which the extraction scripts' --retry-failed mode
+reads back to re-extract just those points.
+"""
+
+import csv
+import os
+import random
+import re
+import threading
+import time
+
+from batch_dispatch import is_size_error
+
+# Substrings (lower-case) of error messages worth retrying unchanged
+TRANSIENT_ERROR_MARKERS = (
+    "quota",
+    "too many requests",
+    "concurrent aggregations",
+    "rate limit",
+    "deadline exceeded",
+    "internal error",
+    "service unavailable",
+    "bad gateway",
+    "connection",
+)
+
+# HTTP 429 / 5xx status codes, only where they are reported as a status
+# ("HTTP 503", "HttpError 429", "status code: 500"), never bare numbers
+# such as an SNo or an element count in the message
+TRANSIENT_STATUS_RE = re.compile(
+    r"\b(?:http|httperror|status(?:\s+code)?|error\s+code)\b[\s:=]*(?:error\s*)?(?:429|5\d\d)\b"
+)
+
+DEAD_LETTER_HEADER = ["SNo", "lat", "lon", "error"]
+
+
+def is_transient(error):
+    """True if an error (or its message) looks like a temporary server-side condition."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    msg = str(error).lower()
+    return (any(marker in msg for marker in TRANSIENT_ERROR_MARKERS)
+            or TRANSIENT_STATUS_RE.search(msg) is not None)
+
+
+def worth_splitting(error):
+    """
+    Whether bisecting a failed batch can help: yes for size-related errors
+    (payload, timeout, memory) and for permanent errors caused by individual
+    points; no for transient errors that already survived the retries.
+    """
+    return is_size_error(error) or not is_transient(error)
+
+
+class RetryBudget:
+    """Thread-safe cap on the number of retries allowed in one run."""
+
+    def __init__(self, max_retries):
+        self.remaining = max_retries
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+def call_with_retry(fn, *args, max_attempts=5, base_delay_s=2.0,
+                    max_delay_s=60.0, budget=None, **kwargs):
+    """
+    Call fn(*args, **kwargs), retrying transient errors with exponential
+    backoff and full jitter: sleep U(0, min(max_delay, base * 2**attempt)).
+
+    Returns (result, n_retries). Size errors, non-transient errors, an
+    exhausted budget and the final failed attempt are re-raised.
+    """
+    retries = 0
+    for attempt in range(max_attempts):
+        try:
+            return fn(*args, **kwargs), retries
+        except Exception as e:
+            last_attempt = attempt == max_attempts - 1
+            if last_attempt or is_size_error(e) or not is_transient(e):
+                raise
+            if budget is not None and not budget.take():
+                raise
+            retries += 1
+            time.sleep(random.uniform(0, min(max_delay_s, base_delay_s * 2 ** attempt)))
+
+
+def write_dead_letter(path, failed):
+    """Write {SNo: (point, error)} to the dead-letter CSV (overwrites)."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(DEAD_LETTER_HEADER)
+        for sno, (p, error) in failed.items():
+            writer.writerow([sno, p["lat"], p["lon"], str(error)])
+
+
+def read_dead_letter(path):
+    """Return the set of SNos listed in a dead-letter CSV (empty if missing)."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {row["SNo"] for row in csv.DictReader(f)}
@@ -0,0 +1,325 @@
+"""
+Point-sampling backends for Earth Engine extraction.
+
+All backends take a batch of point dicts ({"SNo", "lat", "lon"}) and an image,
+and return the getInfo() reply of a FeatureCollection whose features carry
+"SNo" plus one property per band:
+
+  - "mapped":         fc.map(image.reduceRegion(first)) -- one reduction per
+                      feature, the original approach
+  - "reduce_regions": image.reduceRegions(fc, first) -- one reduction over the
+                      whole batch collection
+  - "sample_regions": image.sampleRegions(fc) -- pixel sampling without a
+                      reducer; points whose pixel is masked are omitted
+  - "array":          coordinates are sent as one compact [lon, lat] list and
+                      built into points server-side; values come back from
+                      reduceColumns(toList) as one dense row per point
+                      instead of GeoJSON features with named properties
+
+The "array" backend needs the image's band names (pass `bands`, otherwise one
+extra bandNames() request is made); sample_array() returns its reply as a
+float32 matrix directly. sample_values() returns any backend's reply as that
+matrix plus the reply size, without a per-point dict for array or local.
+
+Every backend samples in the UTM projection of each point's zone at SCALE
+metres (a batch spanning zones becomes one merged collection per zone, still
+one request), so the pixel read is the 10 m UTM pixel that
+pixel_grid.pixel_keys() dedupes and caches by, not a pixel of Earth Engine's
+default EPSG:4326 grid.
+
+"local" is not an Earth Engine backend: `image` is a local_raster.TileSet of
+exported tiles, sampled on this machine in the same reply layout.
+
+benchmark_samplers() runs several backends over the same batches and reports
+points/second and failure rate for each; benchmark_payloads() compares reply
+bytes and client-side parse time of the feature and array encodings.
+"""
+
+import json
+import math
+import time
+
+import numpy as np
+
+from ee_backend import ee
+from pixel_grid import utm_zone
+
+SAMPLING_METHODS = ("mapped", "reduce_regions", "sample_regions", "array")
+SCALE = 10
+LOCAL_METHOD = "local"  # local_raster.TileSet instead of an ee.Image
+NODATA = -9999  # Masked pixels in "array" replies (toList drops nulls)
+
+
+def points_to_fc(points_batch):
+    """Build an ee.FeatureCollection of points carrying their SNo."""
+    return ee.FeatureCollection([
+        ee.Feature(ee.Geometry.Point([p["lon"], p["lat"]]), {"SNo": p["SNo"]})
+        for p in points_batch
+    ])
+
+
+def utm_crs(lat, lon):
+    """EPSG code of the UTM zone whose grid pixel_grid.pixel_keys() snaps a point to."""
+    return f"EPSG:{(32700 if lat < 0 else 32600) + utm_zone(lon)}"
+
+
+def _by_crs(points_batch):
+    """{UTM crs: positions in the batch of the points in that zone}."""
+    groups = {}
+    for i, p in enumerate(points_batch):
+        groups.setdefault(utm_crs(p["lat"], p["lon"]), []).append(i)
+    return groups
+
+
+def _per_zone(points_batch, sample):
+    """
+    Merge sample(crs, points) over the batch's UTM zones into one
+    FeatureCollection, so a batch spanning zones is still a single request.
+    """
+    merged = None
+    for crs, positions in _by_crs(points_batch).items():
+        fc = sample(crs, [points_batch[i] for i in positions])
+        merged = fc if merged is None else merged.merge(fc)
+    return merged
+
+
+def sample_mapped(points_batch, image):
+    """Map reduceRegion(first) over each feature."""
+    def sample_zone(crs, points):
+        def sample_point(feature):
+            values = image.reduceRegion(
+                reducer=ee.Reducer.first(),
+                geometry=feature.geometry(),
+                scale=SCALE,
+                crs=crs,
+            )
+            return feature.set(values)
+
+        return points_to_fc(points).map(sample_point)
+
+    return _per_zone(points_batch, sample_zone).getInfo()
+
+
+def sample_reduce_regions(points_batch, image):
+    """One reduceRegions(first) call over the whole batch collection."""
+    def sample_zone(crs, points):
+        return image.reduceRegions(
+            collection=points_to_fc(points),
+            reducer=ee.Reducer.first(),
+            scale=SCALE,
+            crs=crs,
+        )
+
+    return _per_zone(points_batch, sample_zone).getInfo()
+
+
+def sample_sample_regions(points_batch, image):
+    """One sampleRegions call; masked pixels drop out of the reply."""
+    def sample_zone(crs, points):
+        return image.sampleRegions(
+            collection=points_to_fc(points),
+            properties=["SNo"],
+            projection=ee.Projection(crs).atScale(SCALE),
+            geometries=False,
+        )
+
+    return _per_zone(points_batch, sample_zone).getInfo()
+
+
+def _array_reply(points_batch, image, bands):
+    """
+    getInfo() of {"list": [[i, band values...], ...]}: the batch goes up as a
+    plain coordinate list and comes back as dense rows tagged with their
+    position i in the batch.
+    """
+    coords = ee.List([[p["lon"], p["lat"]] for p in points_batch])
+    unmasked = image.unmask(NODATA)
+    sampled = None
+    for crs, positions in _by_crs(points_batch).items():
+        fc = ee.FeatureCollection(
+            ee.List(positions).map(
+                lambda i: ee.Feature(ee.Geometry.Point(coords.get(i)), {"i": i})
+            )
+        )
+        fc = unmasked.reduceRegions(
+            collection=fc,
+            reducer=ee.Reducer.first(),
+            scale=SCALE,
+            crs=crs,
+        )
+        sampled = fc if sampled is None else sampled.merge(fc)
+    return sampled.reduceColumns(
+        ee.Reducer.toList(len(bands) + 1), ["i"] + list(bands)
+    ).getInfo()
+
+
+def _array_values(reply, n_points, n_bands):
+    """Dense (n_points, n_bands) float32 matrix from an _array_reply; NaN = no data."""
+    values = np.full((n_points, n_bands), np.nan, dtype=np.float32)
+    rows = np.asarray(reply.get("list", []), dtype=np.float64).reshape(-1, n_bands + 1)
+    if len(rows):
+        values[rows[:, 0].astype(np.int64)] = rows[:, 1:]
+    values[values == NODATA] = np.nan
+    return values
+
+
+def sample_array(points_batch, image, bands):
+    """Sample `bands` at every point; returns float32 (len(batch), len(bands))."""
+    return _array_values(_array_reply(points_batch, image, bands),
+                         len(points_batch), len(bands))
+
+
+def sample_array_features(points_batch, image, bands=None):
+    """The "array" backend, returned in the same feature layout as the others."""
+    if bands is None:
+        bands = image.bandNames().getInfo()
+    values = sample_array(points_batch, image, bands)
+    features = []
+    for p, row in zip(points_batch, values.tolist()):
+        props = {"SNo": p["SNo"]}
+        props.update((b, None if math.isnan(v) else v) for b, v in zip(bands, row))
+        features.append({"type": "Feature", "geometry": None, "properties": props})
+    return {"type": "FeatureCollection", "features": features}
+
+
+def features_to_values(info, points_batch, bands):
+    """Dense (len(batch), len(bands)) float32 matrix from a feature reply, by SNo."""
+    values = np.full((len(points_batch), len(bands)), np.nan, dtype=np.float32)
+    position = {str(p["SNo"]): i for i, p in enumerate(points_batch)}
+    for feat in info.get("features", []):
+        props = feat["properties"]
+        i = position.get(str(props.get("SNo", "")))
+        if i is not None:
+            values[i] = [np.nan if props.get(b) is None else props[b] for b in bands]
+    return values
+
+
+def sample_values(points_batch, image, method, bands):
+    """
+    Sample `bands` at every point of the batch as a float32 (len(batch),
+    len(bands)) matrix (NaN = no data), plus the size in bytes of the reply
+    as it came back. The "array" and "local" backends fill the matrix
+    straight from their reply; feature backends are decoded by SNo.
+    """
+    if method == LOCAL_METHOD:
+        values = image.sample([p["lat"] for p in points_batch],
+                              [p["lon"] for p in points_batch], bands)
+        return values, 0  # Nothing crosses the network
+    if method == "array":
+        reply = _array_reply(points_batch, image, bands)
+        reply_bytes = len(json.dumps(reply, separators=(",", ":")))
+        return _array_values(reply, len(points_batch), len(bands)), reply_bytes
+    info = sample_points(points_batch, image, method, bands)
+    reply_bytes = len(json.dumps(info, separators=(",", ":")))
+    return features_to_values(info, points_batch, bands), reply_bytes
+
+
+_SAMPLERS = {
+    "mapped": sample_mapped,
+    "reduce_regions": sample_reduce_regions,
+    "sample_regions": sample_sample_regions,
+}
+
+
+def sample_points(points_batch, image, method="mapped", bands=None):
+    """
+    Sample `image` at every point of the batch with the chosen backend.
+    `bands` (the image's band names) is used by the "array" and "local" backends.
+    """
+    if method == LOCAL_METHOD:
+        return image.sample_features(points_batch, bands)
+    if method == "array":
+        return sample_array_features(points_batch, image, bands)
+    try:
+        sampler = _SAMPLERS[method]
+    except KeyError:
+        raise ValueError(
+            f"Unknown sampling method {method!r}; expected one of "
+            f"{SAMPLING_METHODS + (LOCAL_METHOD,)}"
+        ) from None
+    return sampler(points_batch, image)
+
+
+def benchmark_samplers(batches, image, methods=SAMPLING_METHODS, bands=None):
+    """
+    Sample the same batches with each backend, sequentially, and print
+    points/second, failure rate and points returned per backend.
+    Returns {method: {"seconds", "points_per_s", "failure_rate", "returned"}}.
+    """
+    n_points = sum(len(b) for b in batches)
+    report = {}
+    print(f"\nSampler benchmark: {n_points:,} points in {len(batches)} batches")
+    for method in methods:
+        failures = 0
+        returned = 0
+        t0 = time.time()
+        for batch in batches:
+            try:
+                info = sample_points(batch, image, method, bands)
+                returned += len(info.get("features", []))
+            except Exception as e:
+                failures += 1
+                print(f"  {method}: batch failed: {e}")
+        elapsed = time.time() - t0
+        report[method] = {
+            "seconds": elapsed,
+            "points_per_s": n_points / elapsed if elapsed > 0 else float("inf"),
+            "failure_rate": failures / len(batches) if batches else 0.0,
+            "returned": returned,
+        }
+        r = report[method]
+        print(f"  {method:<16} {elapsed:8.2f}s  {r['points_per_s']:9.1f} pts/s  "
+              f"failures {r['failure_rate'] * 100:5.1f}%  "
+              f"returned {returned:,}/{n_points:,}")
+    return report
+
+
+def benchmark_payloads(batches, image, bands):
+    """
+    Compare the GeoJSON feature encoding ("reduce_regions") with the dense
+    "array" encoding on the same batches: request and reply bytes, request
+    time and the time to decode the reply JSON into a float32 matrix.
+    Returns {mode: {"request_bytes", "reply_bytes", "request_s", "parse_s"}},
+    all per batch.
+    """
+    report = {}
+    print(f"\nPayload benchmark: {len(batches)} batches, {len(bands)} bands")
+    for mode in ("features", "array"):
+        totals = {"request_bytes": 0, "reply_bytes": 0, "request_s": 0.0, "parse_s": 0.0}
+        for batch in batches:
+            if mode == "features":
+                request = [{"type": "Feature",
+                            "geometry": {"type": "Point", "coordinates": [p["lon"], p["lat"]]},
+                            "properties": {"SNo": p["SNo"]}} for p in batch]
+            else:
+                request = [[p["lon"], p["lat"]] for p in batch]
+            totals["request_bytes"] += len(json.dumps(request))
+
+            t0 = time.time()
+            if mode == "features":
+                reply = sample_reduce_regions(batch, image)
+            else:
+                reply = _array_reply(batch, image, bands)
+            totals["request_s"] += time.time() - t0
+            text = json.dumps(reply)
+            totals["reply_bytes"] += len(text)
+
+            # What the client pays to turn the reply into a value matrix
+            t0 = time.time()
+            decoded = json.loads(text)
+            if mode == "features":
+                np.array([[np.nan if f["properties"].get(b) is None else f["properties"][b]
+                           for b in bands] for f in decoded["features"]],
+                         dtype=np.float32)
+            else:
+                _array_values(decoded, len(batch), len(bands))
+            totals["parse_s"] += time.time() - t0
+
+        n = max(len(batches), 1)
+        report[mode] = {k: v / n for k, v in totals.items()}
+        r = report[mode]
+        print(f"  {mode:<9} request {r['request_bytes'] / 1024:8.1f} KB  "
+              f"reply {r['reply_bytes'] / 1024:8.1f} KB  "
+              f"round trip {r['request_s']:6.2f}s  parse {r['parse_s'] * 1000:7.1f} ms  "
+              f"(per batch)")
+    return report
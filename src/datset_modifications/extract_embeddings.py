@@ -2,30 +2,102 @@
 Extract Google Satellite Embedding V1 (2024 annual) for all binned Dataset 1 points.
 Also extracts Sentinel-2 cloud cover statistics for December 2024 at each point.
 
-Uses ee.Feature.map + reduceRegion for reliable embedding extraction.
+Uses ee.Feature.map + reduceRegion for reliable embedding extraction by
+default (--sampler picks another backend, including 'local' exported tiles).
+Points are deduplicated per 10 m pixel, served from a persistent pixel cache
+where possible, and sampled in concurrent, adaptively sized batches; runs are
+incremental and resumable. --years, --cloud-climatology and --patch switch to
+the multi-year, monthly cloud and K x K patch extractions.
 
 Outputs:
   - raw_data/dataset_1/dataset_1_embeddings.csv
+  - raw_data/dataset_1/dataset_1_embeddings.npy  (float32 (n, 64), + _meta.csv)
+  - raw_data/dataset_1/dataset_1_embeddings.failed.csv  (dead-letter SNos)
+  - raw_data/dataset_1/dataset_1_embeddings.metrics.jsonl  (per-batch telemetry)
+  - raw_data/dataset_1/dataset_1_embeddings_multiyear.npy  (--years)
+  - raw_data/dataset_1/dataset_1_cloud_climatology.npy  (--cloud-climatology)
+  - raw_data/dataset_1/dataset_1_embeddings_patch.npy  (--patch, + _patch_stats.npy)
 """
 
+import argparse
 import csv
 import json
 import os
-import time
-import ee
+import warnings
+import numpy as np
+
+from ee_backend import ee
+from batch_dispatch import AdaptiveBatcher, TokenBucket, dispatch_batches
+from ee_retry import (
+    RetryBudget, call_with_retry, read_dead_letter, worth_splitting, write_dead_letter,
+)
+from ee_region import bounded, clipped, report_collection_sizes, study_area
+from ee_sampling import (
+    LOCAL_METHOD, NODATA, SAMPLING_METHODS, benchmark_payloads, benchmark_samplers,
+    sample_points, sample_values,
+)
+from extraction_journal import ExtractionJournal
+from extraction_metrics import RunMetrics
+from local_raster import LOCAL_TILE_WORKERS, TileSet
+from pixel_cache import PixelCache, make_namespace
+from pixel_grid import (
+    POINT_ORDERS, coord_hash, dedupe_points, fan_out, pixel_keys, spatial_order,
+)
+from result_store import ResultStore, format_value
 
 # ── Configuration ──────────────────────────────────────────────────────────
 EE_PROJECT = "gis-hub-464402"
 BASE = r"c:\Users\Kdixter\Desktop\GIS_Analysis_Final\raw_data\dataset_1"
 INPUT_PATH = os.path.join(BASE, "dataset_1_binned.csv")
 OUTPUT_PATH = os.path.join(BASE, "dataset_1_embeddings.csv")
+EMB_NPY_PATH = os.path.join(BASE, "dataset_1_embeddings.npy")
+EMB_META_PATH = os.path.join(BASE, "dataset_1_embeddings_meta.csv")
+JOURNAL_PATH = os.path.join(BASE, "dataset_1_embeddings.journal.jsonl")
+DEAD_LETTER_PATH = os.path.join(BASE, "dataset_1_embeddings.failed.csv")
+METRICS_PATH = os.path.join(BASE, "dataset_1_embeddings.metrics.jsonl")
+MULTI_YEAR_NPY_PATH = os.path.join(BASE, "dataset_1_embeddings_multiyear.npy")
+MULTI_YEAR_META_PATH = os.path.join(BASE, "dataset_1_embeddings_multiyear_meta.csv")
+MULTI_YEAR_METRICS_PATH = os.path.join(BASE, "dataset_1_embeddings_multiyear.metrics.jsonl")
+CLIMATOLOGY_NPY_PATH = os.path.join(BASE, "dataset_1_cloud_climatology.npy")
+CLIMATOLOGY_META_PATH = os.path.join(BASE, "dataset_1_cloud_climatology_meta.csv")
+CLIMATOLOGY_METRICS_PATH = os.path.join(BASE, "dataset_1_cloud_climatology.metrics.jsonl")
+PATCH_NPY_PATH = os.path.join(BASE, "dataset_1_embeddings_patch.npy")
+PATCH_STATS_PATH = os.path.join(BASE, "dataset_1_embeddings_patch_stats.npy")
+PATCH_META_PATH = os.path.join(BASE, "dataset_1_embeddings_patch_meta.csv")
+PATCH_METRICS_PATH = os.path.join(BASE, "dataset_1_embeddings_patch.metrics.jsonl")
+CACHE_PATH = os.path.join(os.path.dirname(BASE), "pixel_cache.sqlite")
+CACHE_MAX_ENTRIES = 2_000_000  # Least recently used pixels evicted beyond this
+LOCAL_TILE_DIR = os.path.join(os.path.dirname(BASE), "tiles")  # For --sampler local
 
 EMBEDDING_COLLECTION = "GOOGLE/SATELLITE_EMBEDDING/V1/ANNUAL"
 CLOUD_COLLECTION = "COPERNICUS/S2_CLOUD_PROBABILITY"
 S2_COLLECTION = "COPERNICUS/S2_SR_HARMONIZED"
 
 EMBEDDING_BANDS = [f"A{i:02d}" for i in range(64)]
-BATCH_SIZE = 2000  # Smaller batches for mapped reduceRegion
+EMBEDDING_YEARS = list(range(2017, 2025))  # Annual images available in V1
+CLOUD_COLUMNS = ["cloud_mean_prob", "total_scenes", "clear_scenes"]
+CLIMATOLOGY_YEAR = 2024
+CLIMATOLOGY_MONTHS = list(range(1, 13))
+PATCH_SIZE = 3  # Default k for --patch (k x k pixels, odd)
+PATCH_STATS_CHUNK = 65536  # Rows per chunk when computing patch statistics
+OUT_HEADER = [
+    "SNo", "lat", "lon", "label", "class_description", "bin"
+] + EMBEDDING_BANDS + CLOUD_COLUMNS + ["cloudy_pct"]
+VALUE_BANDS = EMBEDDING_BANDS + CLOUD_COLUMNS  # Sampled per point, in this order
+BATCH_SIZE = 2000  # Starting batch size; adapted during the run
+MIN_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 5000
+TARGET_BATCH_LATENCY_S = 60.0  # Grow batches while requests finish faster
+MAX_CONCURRENT_REQUESTS = 4  # Batches in flight at once
+REQUESTS_PER_SECOND = 1.0  # New batches started per second
+SAMPLING_METHOD = "mapped"  # One of ee_sampling.SAMPLING_METHODS
+PIXEL_SCALE = 10  # Embedding pixel size (m) used to deduplicate points
+POINT_ORDER = "hilbert"  # Request order: one of pixel_grid.POINT_ORDERS
+ORDER_WINDOW = 10000  # Points curve-ordered together; rows stream once per window
+MAX_ATTEMPTS = 5  # Per request, including the first try
+RETRY_BASE_DELAY_S = 2.0  # Backoff: U(0, min(max, base * 2**attempt))
+RETRY_MAX_DELAY_S = 60.0
+RETRY_BUDGET = 200  # Total retries allowed across the whole run
 
 
 def init_ee():
@@ -54,196 +126,860 @@ def load_points(path):
     return points
 
 
-def extract_embeddings_batch(points_batch, embedding_image):
-    """Extract 64-dim embeddings using mapped reduceRegion."""
-    features = []
-    for p in points_batch:
-        geom = ee.Geometry.Point([p["lon"], p["lat"]])
-        feat = ee.Feature(geom, {"SNo": p["SNo"]})
-        features.append(feat)
+def cloud_collections(start, end, label, region=None):
+    """
+    The collections behind the cloud statistics for one date window:
+    S2 cloud probability, all S2 SR scenes and S2 SR scenes <20% cloudy.
+    """
+    s2 = bounded(ee.ImageCollection(S2_COLLECTION).filterDate(start, end), region)
+    return {
+        f"S2 cloud probability {label}": bounded(
+            ee.ImageCollection(CLOUD_COLLECTION).filterDate(start, end), region
+        ),
+        f"S2 SR {label}": s2,
+        f"S2 SR {label} (<20% cloudy)": s2.filter(
+            ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 20)
+        ),
+    }
+
+
+def cloud_stat_bands(start, end, label, region=None, suffix=""):
+    """[cloud_mean_prob, total_scenes, clear_scenes] images for one window."""
+    collections = cloud_collections(start, end, label, region)
+    cloud_mean = (
+        collections[f"S2 cloud probability {label}"]
+        .mean()
+        .select("probability")
+        .rename(f"cloud_mean_prob{suffix}")
+    )
+    total_scenes = (
+        collections[f"S2 SR {label}"].select("B4").count()
+        .rename(f"total_scenes{suffix}")
+    )
+    clear_scenes = (
+        collections[f"S2 SR {label} (<20% cloudy)"].select("B4").count()
+        .rename(f"clear_scenes{suffix}")
+    )
+    return [cloud_mean, total_scenes, clear_scenes]
+
+
+def sampling_collections(region=None):
+    """
+    The image collections behind the sampling image, each filtered to the
+    study area (region=None leaves them unbounded).
+    """
+    collections = {
+        "embedding 2024": bounded(
+            ee.ImageCollection(EMBEDDING_COLLECTION)
+            .filterDate("2024-01-01", "2025-01-01"), region
+        ),
+    }
+    collections.update(cloud_collections("2024-12-01", "2025-01-01", "Dec 2024", region))
+    return collections
+
+
+def build_sampling_image(region=None):
+    """
+    Stack everything sampled per point into one image:
+    A00..A63 (2024 embedding), cloud_mean_prob, total_scenes, clear_scenes.
+    With a region, every collection is filterBounds'ed and the stack clipped.
+    """
+    print("Loading Satellite Embedding V1 (2024 annual)...")
+    embedding_image = sampling_collections(region)["embedding 2024"].mosaic()
 
-    fc = ee.FeatureCollection(features)
+    print("Loading Sentinel-2 Cloud Probability (Dec 2024)...")
+    cloud_bands = cloud_stat_bands("2024-12-01", "2025-01-01", "Dec 2024", region)
+
+    return clipped(embedding_image.addBands(cloud_bands), region)
+
+
+def month_window(year, month):
+    """("YYYY-MM-01", first day of the next month) for filterDate."""
+    end = f"{year + 1}-01-01" if month == 12 else f"{year}-{month + 1:02d}-01"
+    return f"{year}-{month:02d}-01", end
 
-    def sample_point(feature):
-        geom = feature.geometry()
-        values = embedding_image.reduceRegion(
-            reducer=ee.Reducer.first(),
-            geometry=geom,
-            scale=10,
-        )
-        return feature.set(values)
 
-    sampled = fc.map(sample_point)
-    return sampled.getInfo()
+def climatology_bands():
+    """Band names of the monthly cloud stack, month-major: <stat>_<MM>."""
+    return [f"{col}_{m:02d}" for m in CLIMATOLOGY_MONTHS for col in CLOUD_COLUMNS]
 
 
-def extract_cloud_batch(points_batch, cloud_mean, scene_stack):
-    """Extract cloud stats using mapped reduceRegion."""
-    features = []
-    for p in points_batch:
-        geom = ee.Geometry.Point([p["lon"], p["lat"]])
-        feat = ee.Feature(geom, {"SNo": p["SNo"]})
-        features.append(feat)
+def build_cloud_climatology_image(year, region=None):
+    """
+    Stack cloud_mean_prob, total_scenes and clear_scenes for each of the 12
+    months of `year` (36 bands, see climatology_bands()) into one image.
+    """
+    print(f"Loading Sentinel-2 cloud statistics for every month of {year}...")
+    bands = []
+    for month in CLIMATOLOGY_MONTHS:
+        start, end = month_window(year, month)
+        bands.extend(cloud_stat_bands(start, end, f"{year}-{month:02d}", region,
+                                      suffix=f"_{month:02d}"))
+    return clipped(bands[0].addBands(bands[1:]), region)
 
-    fc = ee.FeatureCollection(features)
 
-    def sample_cloud(feature):
-        geom = feature.geometry()
-        cloud_vals = cloud_mean.reduceRegion(
-            reducer=ee.Reducer.first(),
-            geometry=geom,
-            scale=10,
+def multi_year_collections(years, region=None):
+    """One (bounded) annual embedding collection per year."""
+    return {
+        f"embedding {year}": bounded(
+            ee.ImageCollection(EMBEDDING_COLLECTION)
+            .filterDate(f"{year}-01-01", f"{year + 1}-01-01"), region
         )
-        scene_vals = scene_stack.reduceRegion(
-            reducer=ee.Reducer.first(),
-            geometry=geom,
-            scale=10,
+        for year in years
+    }
+
+
+def build_multi_year_image(years, region=None):
+    """
+    Stack one annual embedding mosaic per year, bands renamed A00_<year> ..
+    A63_<year>, so a single request samples every year at once.
+    """
+    print(f"Loading Satellite Embedding V1 for {len(years)} years "
+          f"({years[0]}..{years[-1]})...")
+    collections = multi_year_collections(years, region)
+    yearly = [
+        collections[f"embedding {year}"]
+        .mosaic()
+        .rename([f"{band}_{year}" for band in EMBEDDING_BANDS])
+        for year in years
+    ]
+    image = yearly[0].addBands(yearly[1:]) if len(yearly) > 1 else yearly[0]
+    return clipped(image, region)
+
+
+def build_patch_image(k, region=None):
+    """
+    2024 embedding mosaic where each band A00..A63 holds the k x k window of
+    10 m pixels around the sampled pixel (neighborhoodToArray); pixels that
+    are masked come back as NODATA.
+    """
+    print(f"Loading Satellite Embedding V1 (2024 annual) as {k}x{k} patches...")
+    embedding_image = sampling_collections(region)["embedding 2024"].mosaic()
+    kernel = ee.Kernel.square(radius=k // 2, units="pixels")
+    return clipped(embedding_image, region).neighborhoodToArray(kernel, defaultValue=NODATA)
+
+
+def patch_stats(patches, chunk=PATCH_STATS_CHUNK):
+    """
+    Per-point mean and std of every band over the k x k window, ignoring
+    missing pixels. patches: (n, k, k, 64) float32 (may be a memmap; read in
+    chunks). Returns float32 (n, 128): 64 means followed by 64 stds.
+    """
+    n, bands = patches.shape[0], patches.shape[-1]
+    out = np.full((n, 2 * bands), np.nan, dtype=np.float32)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN windows
+        for start in range(0, n, chunk):
+            block = np.asarray(patches[start:start + chunk])
+            out[start:start + chunk, :bands] = np.nanmean(block, axis=(1, 2))
+            out[start:start + chunk, bands:] = np.nanstd(block, axis=(1, 2))
+    return out
+
+
+def inter_year_cosine(tensor):
+    """
+    Cosine similarity between consecutive years for every point.
+    tensor: float32 (n, years, 64) with NaN for missing years.
+    Returns float32 (n, years - 1); NaN where either year is missing.
+    """
+    a, b = tensor[:, :-1, :], tensor[:, 1:, :]
+    dot = np.einsum("nyk,nyk->ny", a, b)
+    norms = np.linalg.norm(a, axis=2) * np.linalg.norm(b, axis=2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sim = dot / norms
+    sim[norms == 0] = np.nan
+    return sim.astype(np.float32)
+
+
+def extract_batch(points_batch, sampling_image, method=SAMPLING_METHOD, budget=None):
+    """
+    Sample one batch in a single request (retrying transient errors).
+    Returns (float32 (len(batch), len(VALUE_BANDS)) values or None, list of
+    error strings, number of retries, reply size in bytes).
+    """
+    try:
+        (values, reply_bytes), retries = call_with_retry(
+            sample_values, points_batch, sampling_image, method, VALUE_BANDS,
+            max_attempts=MAX_ATTEMPTS,
+            base_delay_s=RETRY_BASE_DELAY_S,
+            max_delay_s=RETRY_MAX_DELAY_S,
+            budget=budget,
+        )
+    except Exception as e:
+        return None, [f"sampling: {e}"], 0, 0
+    return values, [], retries, reply_bytes
+
+
+def new_result_store(points):
+    """Float32 result arrays: embedding (n, 64) plus one column per cloud stat."""
+    columns = {"embedding": len(EMBEDDING_BANDS)}
+    columns.update({col: 1 for col in CLOUD_COLUMNS})
+    return ResultStore([p["SNo"] for p in points], columns)
+
+
+def store_rows(store, snos, values):
+    """Copy float32 rows of VALUE_BANDS values into the store, row i -> snos[i]."""
+    n_emb = len(EMBEDDING_BANDS)
+    store.put_rows(snos, "embedding", values[:, :n_emb])
+    for j, col in enumerate(CLOUD_COLUMNS):
+        store.put_rows(snos, col, values[:, n_emb + j])
+
+
+def store_result(store, sno, values):
+    """Copy one cached / journaled VALUE_BANDS list (None = missing) into the store."""
+    row = np.array([np.nan if v is None else v for v in values], dtype=np.float32)
+    store_rows(store, [sno], row[np.newaxis])
+
+
+def json_row(row):
+    """A float32 row as a JSON-safe list, NaN -> None (cache and journal values)."""
+    return [None if v != v else v for v in row.tolist()]
+
+
+def load_existing_output(store, points, skip=()):
+    """
+    Fill the store from a previously written OUTPUT_PATH, except for SNos in
+    `skip`, SNos whose coordinates changed since (SNo + coordinate hash must
+    both match the input point) and rows with every embedding and cloud
+    column blank, which were never extracted and are cheap to re-request
+    through the pixel cache.
+    Returns {"kept", "moved", "blank", "removed"} row counts; "removed" counts
+    output rows whose SNo is no longer in the input.
+    """
+    counts = {"kept": 0, "moved": 0, "blank": 0, "removed": 0}
+    if not os.path.exists(OUTPUT_PATH):
+        return counts
+    hashes = {p["SNo"]: coord_hash(p["lat"], p["lon"]) for p in points}
+    value_columns = EMBEDDING_BANDS + CLOUD_COLUMNS
+    with open(OUTPUT_PATH, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            sno = row["SNo"]
+            if sno not in hashes:
+                counts["removed"] += 1
+                continue
+            if sno in skip:
+                continue
+            if coord_hash(row["lat"], row["lon"]) != hashes[sno]:
+                counts["moved"] += 1
+                continue
+            if not any(row[col] for col in value_columns):
+                counts["blank"] += 1
+                continue
+            store.put(sno, "embedding",
+                      [float(row[b]) if row[b] else None for b in EMBEDDING_BANDS])
+            for col in CLOUD_COLUMNS:
+                store.put(sno, col, float(row[col]) if row[col] else None)
+            store.mark_complete([sno])
+            counts["kept"] += 1
+    return counts
+
+
+def cloudy_pct(total, clear):
+    """Percent of scenes that were not clear; blank if either count is missing or zero."""
+    if total > 0 and clear > 0:
+        return round((1 - float(clear) / float(total)) * 100, 1)
+    return ""
+
+
+def write_rows(writer, store, points, rows):
+    """Write output rows [start, stop) straight from the store's arrays."""
+    start, stop = rows
+    emb = store.column("embedding", slice(start, stop))
+    prob = store.column("cloud_mean_prob", slice(start, stop))
+    total = store.column("total_scenes", slice(start, stop))
+    clear = store.column("clear_scenes", slice(start, stop))
+    has_emb = ~np.isnan(emb).all(axis=1)
+    for i in range(stop - start):
+        p = points[start + i]
+        row = [p["SNo"], p["lat"], p["lon"], p["label"],
+               p["class_description"], p["bin"]]
+        if has_emb[i]:
+            row.extend(format_value(v) for v in emb[i])
+        else:
+            row.extend([""] * len(EMBEDDING_BANDS))
+        row.append(format_value(prob[i]))
+        row.append(format_value(total[i], integer=True))
+        row.append(format_value(clear[i], integer=True))
+        row.append(cloudy_pct(total[i], clear[i]))
+        writer.writerow(row)
+    return int(has_emb.sum())
+
+
+def write_columnar(store, points):
+    """
+    Save the embedding matrix as a memory-mappable float32 .npy plus a metadata
+    CSV whose row i describes matrix row i (no embedding columns to parse).
+    """
+    store.save_npy("embedding", EMB_NPY_PATH)
+    meta_header = [h for h in OUT_HEADER if h not in EMBEDDING_BANDS]
+    with open(EMB_META_PATH, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(meta_header)
+        prob = store.column("cloud_mean_prob")
+        total = store.column("total_scenes")
+        clear = store.column("clear_scenes")
+        for i, p in enumerate(points):
+            writer.writerow([
+                p["SNo"], p["lat"], p["lon"], p["label"], p["class_description"],
+                p["bin"], format_value(prob[i]), format_value(total[i], integer=True),
+                format_value(clear[i], integer=True), cloudy_pct(total[i], clear[i]),
+            ])
+
+
+def sample_stack(points, image, bands, metrics_path, start_size,
+                 method=SAMPLING_METHOD, order=POINT_ORDER,
+                 width=None, decode=None, out_file=None):
+    """
+    Sample `bands` of a stacked image at every point (deduplicated per pixel,
+    spatially ordered, adaptively batched, retried) into a ResultStore with
+    one float32 column "values" of width len(bands). Returns (store, metrics).
+
+    Plain bands are sampled straight into a float32 matrix (sample_values).
+    For array-valued bands pass the row `width`, a `decode(props)` that turns
+    a feature's properties into that many values, and optionally
+    out_file=(path, shape) to keep the column in a memory-mapped .npy.
+    """
+    width = width or len(bands)
+    store = ResultStore([p["SNo"] for p in points], {"values": width},
+                        out_files={"values": out_file} if out_file else None)
+
+    unique, pixel_groups = dedupe_points(points, PIXEL_SCALE)
+    print(f"Pixel dedup: {len(unique):,} unique pixels for {len(points):,} points")
+    unique = spatial_order(unique, order)
+
+    batcher = AdaptiveBatcher(
+        unique, start_size,
+        min_size=MIN_BATCH_SIZE,
+        max_size=MAX_BATCH_SIZE,
+        target_latency_s=TARGET_BATCH_LATENCY_S,
+    )
+    limiter = TokenBucket(REQUESTS_PER_SECOND, burst=MAX_CONCURRENT_REQUESTS)
+    budget = RetryBudget(RETRY_BUDGET)
+
+    def sample_decoded(batch):
+        """Feature reply decoded into (len(batch), width) rows, plus its size."""
+        info = sample_points(batch, image, method, bands)
+        values = np.full((len(batch), width), np.nan, dtype=np.float32)
+        position = {p["SNo"]: i for i, p in enumerate(batch)}
+        for feat in info.get("features", []):
+            props = feat["properties"]
+            i = position.get(str(props.get("SNo", "")))
+            if i is not None:
+                values[i] = decode(props)
+        return values, len(json.dumps(info, separators=(",", ":")))
+
+    def worker(batch):
+        if decode is None:
+            fn, args = sample_values, (batch, image, method, bands)
+        else:
+            fn, args = sample_decoded, (batch,)
+        return call_with_retry(
+            fn, *args,
+            max_attempts=MAX_ATTEMPTS,
+            base_delay_s=RETRY_BASE_DELAY_S,
+            max_delay_s=RETRY_MAX_DELAY_S,
+            budget=budget,
         )
-        return feature.set({
-            "cloud_mean_prob": cloud_vals.get("probability"),
-            "total_scenes": scene_vals.get("total_scenes"),
-            "clear_scenes": scene_vals.get("clear_scenes"),
-        })
 
-    sampled = fc.map(sample_cloud)
-    return sampled.getInfo()
+    print(f"Processing {len(unique):,} points x {len(bands)} bands in batches "
+          f"starting at {start_size}...\n")
+    with RunMetrics(metrics_path) as metrics:
+        for batch_idx, batch, result, error, elapsed in dispatch_batches(
+            batcher, worker, MAX_CONCURRENT_REQUESTS, limiter
+        ):
+            print(f"  Batch {batch_idx + 1} ({len(batch)} points)...", end=" ")
+            status = batcher.report(batch_idx, batch, error is None, elapsed,
+                                    error=error, split=worth_splitting(error))
+            if error is not None:
+                print(f"\n    WARNING: {error} -> {status}")
+                failed = 0
+                if status == "failed":
+                    failed = sum(len(pixel_groups[p["SNo"]]) for p in batch)
+                metrics.batch(batch_idx, status, len(batch), elapsed, failed=failed)
+                continue
+            (values, reply_bytes), retries = result
+            # Fan each pixel's row out to every SNo sharing that pixel
+            snos, rows = [], []
+            for i, p in enumerate(batch):
+                group = pixel_groups[p["SNo"]]
+                snos.extend(group)
+                rows.extend([i] * len(group))
+            store.put_rows(snos, "values", values[rows])
+            metrics.batch(
+                batch_idx, "ok", len(batch), elapsed, snos=len(snos), retries=retries,
+                reply_bytes=reply_bytes,
+            )
+            print(f"done ({elapsed:.1f}s) [next size {batcher.size}]")
+        metrics.finish()
+
+    print(f"\nBatching: {batcher.summary()}")
+    return store, metrics
+
+
+def write_point_meta(path, points, extra_header, extra_columns):
+    """Per-row metadata CSV (row i = point i) plus float32 extra columns."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["SNo", "lat", "lon", "label", "class_description", "bin"]
+                        + extra_header)
+        for i, p in enumerate(points):
+            writer.writerow([p["SNo"], p["lat"], p["lon"], p["label"],
+                             p["class_description"], p["bin"]]
+                            + [format_value(col[i]) for col in extra_columns])
+
+
+def extract_multi_year(points, years, method=SAMPLING_METHOD, order=POINT_ORDER):
+    """
+    Multi-year mode: sample the year-stacked embedding image for every point
+    and save a float32 (n, years, 64) tensor plus per-point metadata and
+    consecutive-year cosine similarities.
+    """
+    region = study_area(points)
+    report_collection_sizes(multi_year_collections(years, region))
+    image = build_multi_year_image(years, region)
+    bands = [f"{band}_{year}" for year in years for band in EMBEDDING_BANDS]
+
+    # Each feature carries years * 64 values, so start with smaller batches
+    start_size = max(MIN_BATCH_SIZE, BATCH_SIZE // len(years))
+    store, metrics = sample_stack(points, image, bands, MULTI_YEAR_METRICS_PATH,
+                                  start_size, method, order)
+
+    n = len(points)
+    tensor = store.column("values").reshape(n, len(years), len(EMBEDDING_BANDS))
+    store.save_npy("values", MULTI_YEAR_NPY_PATH, shape=tensor.shape)
+    similarity = inter_year_cosine(tensor)
+    sim_columns = [f"cos_{a}_{b}" for a, b in zip(years[:-1], years[1:])]
+    write_point_meta(MULTI_YEAR_META_PATH, points, sim_columns, list(similarity.T))
+
+    # Summary
+    has_year = ~np.isnan(tensor).all(axis=2)
+    print(f"\n{'='*60}")
+    print("MULTI-YEAR EXTRACTION COMPLETE")
+    print(f"{'='*60}")
+    print(f"  Tensor: {MULTI_YEAR_NPY_PATH} {tensor.shape} float32 "
+          f"({tensor.nbytes / 1e6:.1f} MB)")
+    print(f"  Metadata: {MULTI_YEAR_META_PATH}")
+    print(f"  Points with every year:      {int(has_year.all(axis=1).sum()):,}")
+    print(f"  Points failed:               {metrics.failed:,}")
+    for j, col in enumerate(sim_columns):
+        valid = similarity[:, j][~np.isnan(similarity[:, j])]
+        if len(valid):
+            print(f"  {col}: mean {valid.mean():.3f}, p5 {np.percentile(valid, 5):.3f} "
+                  f"({len(valid):,} points)")
+
+
+def extract_cloud_climatology(points, year=CLIMATOLOGY_YEAR, method=SAMPLING_METHOD,
+                              order=POINT_ORDER):
+    """
+    Cloud climatology mode: sample the 36-band monthly cloud stack once per
+    point and save a float32 (n, 12, 3) array (month x cloud_mean_prob /
+    total_scenes / clear_scenes), per-point metadata and a monthly summary.
+    """
+    region = study_area(points)
+    report_collection_sizes({
+        f"S2 SR {year}-{m:02d}": bounded(
+            ee.ImageCollection(S2_COLLECTION).filterDate(*month_window(year, m)), region
+        )
+        for m in CLIMATOLOGY_MONTHS
+    })
+    image = build_cloud_climatology_image(year, region)
+    bands = climatology_bands()
+    store, metrics = sample_stack(points, image, bands, CLIMATOLOGY_METRICS_PATH,
+                                  BATCH_SIZE, method, order)
+
+    n = len(points)
+    clim = store.column("values").reshape(n, len(CLIMATOLOGY_MONTHS), len(CLOUD_COLUMNS))
+    store.save_npy("values", CLIMATOLOGY_NPY_PATH, shape=clim.shape)
+
+    prob, total, clear = clim[..., 0], clim[..., 1], clim[..., 2]
+    has_prob = ~np.isnan(prob)
+    any_prob = has_prob.any(axis=1)
+    # Clearest month per point (1-12), NaN for points without any data
+    clearest = np.full(n, np.nan, dtype=np.float32)
+    clearest[any_prob] = np.argmin(np.where(has_prob, prob, np.inf)[any_prob], axis=1) + 1
+    annual = np.full(n, np.nan, dtype=np.float32)
+    annual[any_prob] = np.nanmean(prob[any_prob], axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        clear_frac = np.where(total > 0, clear / total, np.nan)
+    write_point_meta(CLIMATOLOGY_META_PATH, points,
+                     ["clearest_month", "annual_mean_cloud_prob"], [clearest, annual])
+
+    # Summary
+    print(f"\n{'='*60}")
+    print(f"CLOUD CLIMATOLOGY COMPLETE ({year})")
+    print(f"{'='*60}")
+    print(f"  Array: {CLIMATOLOGY_NPY_PATH} {clim.shape} float32 ({clim.nbytes / 1e6:.1f} MB)")
+    print(f"  Metadata: {CLIMATOLOGY_META_PATH}")
+    print(f"  Points with cloud data:      {int(any_prob.sum()):,}")
+    print(f"  Points failed:               {metrics.failed:,}")
+    if not any_prob.any():
+        return
+    with np.errstate(invalid="ignore"):
+        month_prob = np.nanmean(prob, axis=0)
+        month_total = np.nanmean(total, axis=0)
+        month_clear = np.nanmean(clear_frac, axis=0)
+    votes = np.bincount(clearest[any_prob].astype(np.int64),
+                        minlength=len(CLIMATOLOGY_MONTHS) + 1)[1:]
+    print(f"\n  {'Month':<7}{'Mean prob':>10}{'Scenes':>8}{'Clear %':>9}{'Clearest for':>14}")
+    for i, month in enumerate(CLIMATOLOGY_MONTHS):
+        print(f"  {month:<7}{month_prob[i]:>9.1f}%{month_total[i]:>8.1f}"
+              f"{month_clear[i] * 100:>8.1f}%{votes[i]:>14,}")
+    print(f"  Clearest month overall: {CLIMATOLOGY_MONTHS[int(np.nanargmin(month_prob))]} | "
+          f"cloudiest: {CLIMATOLOGY_MONTHS[int(np.nanargmax(month_prob))]}")
+
+
+def extract_patches(points, k=PATCH_SIZE, method=SAMPLING_METHOD, order=POINT_ORDER):
+    """
+    Patch mode: sample the k x k neighbourhood of the 2024 embedding around
+    every point into a float32 (n, k, k, 64) memmap, then derive per-point
+    patch mean / std features (n, 128) for training.
+    """
+    if method == "array":
+        raise ValueError("Patch mode needs a feature sampler (mapped / "
+                         "reduce_regions / sample_regions), not 'array'")
+    region = study_area(points)
+    image = build_patch_image(k, region)
+    n, n_bands = len(points), len(EMBEDDING_BANDS)
+
+    def decode(props):
+        window = np.full((n_bands, k, k), np.nan, dtype=np.float32)
+        for j, band in enumerate(EMBEDDING_BANDS):
+            value = props.get(band)
+            if value is not None:
+                window[j] = value
+        window[window == NODATA] = np.nan
+        return window.transpose(1, 2, 0).ravel()
+
+    # Each feature carries k * k * 64 values, so start with smaller batches
+    start_size = max(MIN_BATCH_SIZE, BATCH_SIZE // (k * k))
+    store, metrics = sample_stack(
+        points, image, EMBEDDING_BANDS, PATCH_METRICS_PATH, start_size, method, order,
+        width=k * k * n_bands, decode=decode,
+        out_file=(PATCH_NPY_PATH, (n, k, k, n_bands)),
+    )
+    store.flush()
+    patches = store.column("values").reshape(n, k, k, n_bands)
+
+    stats = patch_stats(patches)
+    out = np.lib.format.open_memmap(PATCH_STATS_PATH, mode="w+", dtype=np.float32,
+                                    shape=stats.shape)
+    out[:] = stats
+    out.flush()
+    del out
+    write_point_meta(PATCH_META_PATH, points, [], [])
+
+    # Summary (vectorised over the stats, not the full patches)
+    means, stds = stats[:, :n_bands], stats[:, n_bands:]
+    has_patch = ~np.isnan(means).all(axis=1)
+    heterogeneity = np.full(n, np.nan, dtype=np.float32)
+    heterogeneity[has_patch] = np.nanmean(stds[has_patch], axis=1)
+    print(f"\n{'='*60}")
+    print(f"PATCH EXTRACTION COMPLETE ({k}x{k})")
+    print(f"{'='*60}")
+    print(f"  Patches: {PATCH_NPY_PATH} {patches.shape} float32 "
+          f"({patches.nbytes / 1e6:.1f} MB)")
+    print(f"  Stats:   {PATCH_STATS_PATH} {stats.shape} (64 means + 64 stds)")
+    print(f"  Points with a patch:         {int(has_patch.sum()):,}")
+    print(f"  Points failed:               {metrics.failed:,}")
+    if has_patch.any():
+        bins = np.array([p["bin"] for p in points])[has_patch]
+        names, inverse = np.unique(bins, return_inverse=True)
+        totals = np.bincount(inverse, weights=heterogeneity[has_patch])
+        counts = np.bincount(inverse)
+        print("  Mean within-patch std (higher = point near a class boundary):")
+        for name, total, count in zip(names, totals, counts):
+            print(f"    {name:<20} {total / count:.4f}  ({count:,} points)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sampler", choices=SAMPLING_METHODS + (LOCAL_METHOD,),
+                        default=SAMPLING_METHOD,
+                        help="Earth Engine point-sampling backend, or 'local' to "
+                             "read exported tiles from --tiles")
+    parser.add_argument("--tiles", metavar="DIR", default=LOCAL_TILE_DIR,
+                        help="Tile directory for --sampler local (.npy + .json or .tif)")
+    parser.add_argument("--order", choices=POINT_ORDERS, default=POINT_ORDER,
+                        help="Order points are batched in (output order is unchanged)")
+    parser.add_argument("--benchmark-samplers", type=int, metavar="N", default=0,
+                        help="Benchmark every sampler on the first N points and exit")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Re-extract only the SNos in the dead-letter file and "
+                             "points with no extracted row in the existing output; "
+                             "keep all other rows")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the existing output and journal and re-extract "
+                             "every point (the pixel cache is still used)")
+    parser.add_argument("--years", type=int, nargs="+", metavar="YEAR",
+                        choices=EMBEDDING_YEARS,
+                        help="Multi-year mode: extract these annual embeddings "
+                             "into a (points x years x 64) tensor and exit")
+    parser.add_argument("--cloud-climatology", type=int, nargs="?", metavar="YEAR",
+                        const=CLIMATOLOGY_YEAR, default=None,
+                        help="Sample monthly cloud statistics for YEAR (default "
+                             f"{CLIMATOLOGY_YEAR}) into a (points x 12 x 3) array and exit")
+    parser.add_argument("--patch", type=int, nargs="?", metavar="K", const=PATCH_SIZE,
+                        default=None,
+                        help=f"Extract the K x K (odd, default {PATCH_SIZE}) embedding "
+                             "window around each point into a (points x K x K x 64) "
+                             ".npy plus patch mean/std features and exit")
+    return parser.parse_args()
 
 
 def main():
-    init_ee()
+    args = parse_args()
+    local = args.sampler == LOCAL_METHOD
+    if local and (args.years or args.cloud_climatology or args.patch is not None):
+        raise SystemExit("--sampler local only supports the default 2024 extraction")
+    if not local:
+        init_ee()
 
     # Load points
     points = load_points(INPUT_PATH)
     print(f"Loaded {len(points):,} points from binned dataset.")
 
-    # Prepare EE imagery
-    print("Loading Satellite Embedding V1 (2024 annual)...")
-    embedding_image = (
-        ee.ImageCollection(EMBEDDING_COLLECTION)
-        .filterDate("2024-01-01", "2025-01-01")
-        .mosaic()
-    )
-
-    print("Loading Sentinel-2 Cloud Probability (Dec 2024)...")
-    cloud_mean = (
-        ee.ImageCollection(CLOUD_COLLECTION)
-        .filterDate("2024-12-01", "2025-01-01")
-        .mean()
-    )
-
-    s2_col = (
-        ee.ImageCollection(S2_COLLECTION)
-        .filterDate("2024-12-01", "2025-01-01")
-    )
-    total_scenes = s2_col.select("B4").count().rename("total_scenes")
-    clear_scenes = (
-        s2_col.filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", 20))
-        .select("B4")
-        .count()
-        .rename("clear_scenes")
+    if args.years:
+        extract_multi_year(points, sorted(set(args.years)), args.sampler, args.order)
+        return
+    if args.cloud_climatology:
+        extract_cloud_climatology(points, args.cloud_climatology, args.sampler, args.order)
+        return
+    if args.patch is not None:
+        if args.patch < 1 or args.patch % 2 == 0:
+            raise SystemExit(f"--patch K must be an odd positive integer, got {args.patch}")
+        if args.sampler == "array":
+            raise SystemExit("--patch needs a feature sampler (mapped / reduce_regions / "
+                             "sample_regions), not --sampler array")
+        extract_patches(points, args.patch, args.sampler, args.order)
+        return
+
+    if local:
+        # Exported tiles stand in for the EE image; the sampler is the same
+        sampling_image = TileSet(args.tiles, LOCAL_TILE_WORKERS)
+        print(f"Local tiles: {sampling_image.summary()} ({args.tiles})")
+        missing = [b for b in EMBEDDING_BANDS + CLOUD_COLUMNS
+                   if b not in sampling_image.bands]
+        if missing:
+            print(f"  Not in the tiles, left blank: {', '.join(missing)}")
+    else:
+        # Prepare EE imagery (one stacked image, one request per batch),
+        # bounded to the points' study area
+        region = study_area(points)
+        report_collection_sizes(sampling_collections(region))
+        sampling_image = build_sampling_image(region)
+
+    if args.benchmark_samplers:
+        subset = points[:args.benchmark_samplers]
+        batches = [subset[i:i + BATCH_SIZE] for i in range(0, len(subset), BATCH_SIZE)]
+        if local:
+            benchmark_samplers(batches, sampling_image, methods=(LOCAL_METHOD,),
+                               bands=EMBEDDING_BANDS + CLOUD_COLUMNS)
+            return
+        benchmark_samplers(batches, sampling_image, bands=EMBEDDING_BANDS + CLOUD_COLUMNS)
+        benchmark_payloads(batches, sampling_image, EMBEDDING_BANDS + CLOUD_COLUMNS)
+        return
+
+    journal = ExtractionJournal(JOURNAL_PATH)
+    metrics = RunMetrics(METRICS_PATH)
+    store = new_result_store(points)
+    point_hashes = {p["SNo"]: coord_hash(p["lat"], p["lon"]) for p in points}
+    if args.retry_failed:
+        # Dead-lettered points, and points with no extracted row in the
+        # existing output, are requested; the rest is kept as written
+        failed_snos = read_dead_letter(DEAD_LETTER_PATH)
+        diff = load_existing_output(store, points, skip=failed_snos)
+        pending = [p for p, done in zip(points, store.complete) if not done]
+        print(f"Retry-failed mode: {len(pending):,} dead-lettered or missing points "
+              f"to extract, {diff['kept']:,} existing rows kept")
+    else:
+        if args.full:
+            if os.path.exists(JOURNAL_PATH):
+                os.remove(JOURNAL_PATH)
+        else:
+            # Incremental: keep existing output rows whose SNo and coordinates
+            # are unchanged; new, moved and dead-lettered points are extracted
+            diff = load_existing_output(store, points,
+                                        skip=read_dead_letter(DEAD_LETTER_PATH))
+            n_new = len(points) - diff["kept"] - diff["moved"] - diff["blank"]
+            print(f"Incremental: {diff['kept']:,} unchanged rows kept | "
+                  f"{diff['moved']:,} moved, {diff['blank']:,} blank, "
+                  f"{n_new:,} new or failed, {diff['removed']:,} removed")
+        # Replay the journal of an interrupted run: those batches are not
+        # re-requested, unless the point has moved since it was journaled
+        n_replayed = n_stale = 0
+        for sno, res in journal.replay():
+            row = store.index.get(sno)
+            if row is None or store.complete[row]:
+                continue
+            if res.get("coord_hash") != point_hashes[sno] or "values" not in res:
+                n_stale += 1
+                continue
+            store_result(store, sno, res["values"])
+            store.mark_complete([sno])
+            n_replayed += 1
+        pending = [p for p, done in zip(points, store.complete) if not done]
+        print(f"Points recovered from journal: {n_replayed:,} "
+              f"({n_stale:,} moved since, skipped) | to extract: {len(pending):,}")
+
+    # One request per pixel: points sharing a 10 m pixel get identical values
+    unique, pixel_groups = dedupe_points(pending, PIXEL_SCALE)
+    saved = len(pending) - len(unique)
+    batches_saved = ((len(pending) + BATCH_SIZE - 1) // BATCH_SIZE
+                     - (len(unique) + BATCH_SIZE - 1) // BATCH_SIZE)
+    print(f"Pixel dedup: {len(unique):,} unique pixels for {len(pending):,} points "
+          f"-> {saved:,} point samples saved (~{batches_saved} batch requests)")
+
+    # Serve pixels sampled by earlier runs from the local cache
+    cache = PixelCache(CACHE_PATH, CACHE_MAX_ENTRIES)
+    if local:
+        # Tile values are cached apart from EE values (tiles may lack bands)
+        cache_ns = make_namespace("local", sampling_image.fingerprint(), "rows",
+                                  bands=VALUE_BANDS)
+    else:
+        cache_ns = make_namespace(
+            EMBEDDING_COLLECTION, "2024", CLOUD_COLLECTION, "2024-12", "rows",
+            bands=VALUE_BANDS,
+        )
+    rep_keys = dict(zip(
+        (p["SNo"] for p in unique),
+        pixel_keys([p["lat"] for p in unique], [p["lon"] for p in unique], PIXEL_SCALE),
+    ))
+    cached = cache.get_many(cache_ns, rep_keys.values())
+    hits = {sno: cached[key] for sno, key in rep_keys.items() if key in cached}
+    for sno, res in fan_out(hits, pixel_groups).items():
+        store_result(store, sno, res)
+        store.mark_complete([sno])
+    unique = [p for p in unique if p["SNo"] not in hits]
+    print(f"Pixel cache: {len(hits):,} hits, {len(unique):,} misses to request "
+          f"({len(cache):,} pixels cached)")
+
+    # Rows already filled (journal / existing output / cache) are counted
+    # once here; batches then add to the count as they land
+    metrics.with_data = int((~np.isnan(store.arrays["embedding"]).all(axis=1)).sum())
+
+    # Batches follow a space-filling curve so each covers a compact area,
+    # within windows of input rows so the streamed output prefix can advance
+    unique = spatial_order(unique, args.order, window=ORDER_WINDOW)
+
+    # Process in adaptively sized batches
+    batcher = AdaptiveBatcher(
+        unique, BATCH_SIZE,
+        min_size=MIN_BATCH_SIZE,
+        max_size=MAX_BATCH_SIZE,
+        target_latency_s=TARGET_BATCH_LATENCY_S,
     )
-    scene_stack = total_scenes.addBands(clear_scenes)
-
-    # Process in batches
-    total_batches = (len(points) + BATCH_SIZE - 1) // BATCH_SIZE
-    print(f"Processing {total_batches} batches of up to {BATCH_SIZE} points each...\n")
-
-    embedding_results = {}
-    cloud_results = {}
-
-    for batch_idx in range(total_batches):
-        start = batch_idx * BATCH_SIZE
-        end = min(start + BATCH_SIZE, len(points))
-        batch = points[start:end]
-        print(f"  Batch {batch_idx + 1}/{total_batches} "
-              f"(points {start + 1}-{end})...", end=" ", flush=True)
-
-        t0 = time.time()
-
-        # Embeddings
-        try:
-            emb_info = extract_embeddings_batch(batch, embedding_image)
-            for feat in emb_info.get("features", []):
-                props = feat["properties"]
-                sno = str(props.get("SNo", ""))
-                embedding_results[sno] = {
-                    band: props.get(band) for band in EMBEDDING_BANDS
-                }
-        except Exception as e:
-            print(f"\n    WARNING: Embedding extraction failed: {e}")
-
-        # Cloud stats
-        try:
-            cloud_info = extract_cloud_batch(batch, cloud_mean, scene_stack)
-            for feat in cloud_info.get("features", []):
-                props = feat["properties"]
-                sno = str(props.get("SNo", ""))
-                cloud_results[sno] = {
-                    "cloud_mean_prob": props.get("cloud_mean_prob"),
-                    "total_scenes": props.get("total_scenes"),
-                    "clear_scenes": props.get("clear_scenes"),
-                }
-        except Exception as e:
-            print(f"\n    WARNING: Cloud stats failed: {e}")
-
-        elapsed = time.time() - t0
-        emb_ok = sum(1 for s in embedding_results.values()
-                     if any(v is not None for v in s.values()))
-        print(f"done ({elapsed:.1f}s) [embeddings so far: {emb_ok:,}]")
-
-        # Throttle
-        if batch_idx < total_batches - 1:
-            time.sleep(1)
-
-    # Merge and write output
-    print(f"\nMerging results and writing to {OUTPUT_PATH}...")
-
-    out_header = [
-        "SNo", "lat", "lon", "label", "class_description", "bin"
-    ] + EMBEDDING_BANDS + [
-        "cloud_mean_prob", "total_scenes", "clear_scenes", "cloudy_pct"
-    ]
-
+    print(f"Processing {len(unique):,} points in batches starting at {BATCH_SIZE} "
+          f"({MAX_CONCURRENT_REQUESTS} in flight, {REQUESTS_PER_SECOND}/s)...\n")
+
+    # Local tiles have no request quota to respect
+    limiter = None if local else TokenBucket(REQUESTS_PER_SECOND,
+                                             burst=MAX_CONCURRENT_REQUESTS)
+    budget = RetryBudget(RETRY_BUDGET)
+    dead_letter = {}
+
+    def worker(batch):
+        return extract_batch(batch, sampling_image, args.sampler, budget)
+
+    # Rows are streamed to the output as soon as all earlier rows are complete
+    # The merged output goes to a temporary file that replaces OUTPUT_PATH
+    # only once complete, so an interrupted run keeps the previous output
+    print(f"Streaming results to {OUTPUT_PATH}...")
+    tmp_output = OUTPUT_PATH + ".tmp"
     written = 0
     with_emb = 0
-    with open(OUTPUT_PATH, "w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=out_header)
-        writer.writeheader()
-
-        for p in points:
-            sno = p["SNo"]
-            row = {
-                "SNo": sno,
-                "lat": p["lat"],
-                "lon": p["lon"],
-                "label": p["label"],
-                "class_description": p["class_description"],
-                "bin": p["bin"],
-            }
-
-            # Add embeddings
-            emb = embedding_results.get(sno, {})
-            has_emb = any(v is not None for v in emb.values())
-            if has_emb:
-                with_emb += 1
-            for band in EMBEDDING_BANDS:
-                row[band] = emb.get(band, "") if has_emb else ""
-
-            # Add cloud stats
-            cld = cloud_results.get(sno, {})
-            row["cloud_mean_prob"] = cld.get("cloud_mean_prob", "")
-            row["total_scenes"] = cld.get("total_scenes", "")
-            row["clear_scenes"] = cld.get("clear_scenes", "")
-
-            total = cld.get("total_scenes")
-            clear = cld.get("clear_scenes")
-            if total and clear and total > 0:
-                row["cloudy_pct"] = round((1 - clear / total) * 100, 1)
+    with journal, metrics, open(tmp_output, "w", encoding="utf-8", newline="") as out_f:
+        writer = csv.writer(out_f)
+        writer.writerow(OUT_HEADER)
+        metrics.cache(len(hits), len(unique))
+
+        for batch_idx, batch, result, error, elapsed in dispatch_batches(
+            batcher, worker, MAX_CONCURRENT_REQUESTS, limiter
+        ):
+            batch_snos = [p["SNo"] for p in batch]
+            print(f"  Batch {batch_idx + 1} ({len(batch)} points, "
+                  f"SNo {batch_snos[0]}..{batch_snos[-1]})...", end=" ")
+
+            if error is not None:
+                values, errors, retries, reply_bytes = None, [str(error)], 0, 0
             else:
-                row["cloudy_pct"] = ""
-
-            writer.writerow(row)
-            written += 1
+                values, errors, retries, reply_bytes = result
+
+            # A failed batch is bisected and re-queued instead of dropped,
+            # unless it failed on a transient error that retries could not fix
+            err_msg = "; ".join(errors)
+            status = batcher.report(batch_idx, batch, not errors, elapsed,
+                                    error=err_msg, split=worth_splitting(err_msg))
+            if errors:
+                print(f"\n    WARNING: {err_msg} -> {status}", end=" ")
+                n_failed = 0
+                if status == "failed":
+                    for p in batch:
+                        for sno in pixel_groups[p["SNo"]]:
+                            dead_letter[sno] = (p, err_msg)
+                            n_failed += 1
+                    store.mark_complete(sno for p in batch
+                                        for sno in pixel_groups[p["SNo"]])
+                journal.record(batch_idx, batch_snos, status, error=err_msg,
+                               elapsed_s=round(elapsed, 3), retries=retries)
+                metrics.batch(batch_idx, status, len(batch), elapsed,
+                              retries=retries, failed=n_failed)
+            else:
+                # Rows go straight into the store, fanned out to every SNo in
+                # the pixel; the cache and journal keep them as plain lists
+                pixel_rows = {sno: json_row(row) for sno, row in zip(batch_snos, values)}
+                cache.put_many(cache_ns, {
+                    rep_keys[sno]: row for sno, row in pixel_rows.items()
+                })
+                snos, rows = [], []
+                for i, sno in enumerate(batch_snos):
+                    snos.extend(pixel_groups[sno])
+                    rows.extend([i] * len(pixel_groups[sno]))
+                store_rows(store, snos, values[rows])
+                store.mark_complete(snos)
+                # Each result carries its point's coordinate hash, so a replay
+                # against a changed input skips points that have moved
+                journal.record(batch_idx, batch_snos, "ok",
+                               results={sno: {"values": pixel_rows[batch_snos[i]],
+                                              "coord_hash": point_hashes[sno]}
+                                        for sno, i in zip(snos, rows)},
+                               elapsed_s=round(elapsed, 3), retries=retries)
+                has_emb = ~np.isnan(values[:, :len(EMBEDDING_BANDS)]).all(axis=1)
+                metrics.batch(
+                    batch_idx, "ok", len(batch), elapsed,
+                    snos=len(snos), reply_bytes=reply_bytes, retries=retries,
+                    with_data=int(has_emb[rows].sum()),
+                )
+
+            ready = store.take_ready()
+            if ready:
+                with_emb += write_rows(writer, store, points, ready)
+                written = ready[1]
+
+            print(f"done ({elapsed:.1f}s) [embeddings so far: {metrics.with_data:,}, "
+                  f"rows written: {written:,}, next size {batcher.size}]")
+
+        # Points that never succeeded are written with empty bands
+        ready = store.take_ready(final=True)
+        if ready:
+            with_emb += write_rows(writer, store, points, ready)
+            written = ready[1]
+        metrics.finish()
+
+    os.replace(tmp_output, OUTPUT_PATH)
+    # Every result is now in OUTPUT_PATH; the journal only exists to resume
+    # an interrupted run and must not be replayed against a changed input
+    if os.path.exists(JOURNAL_PATH):
+        os.remove(JOURNAL_PATH)
+    cache.close()
+    print(f"\nBatching: {batcher.summary()} | "
+          f"retry budget left: {budget.remaining}/{RETRY_BUDGET}")
+
+    write_dead_letter(DEAD_LETTER_PATH, dead_letter)
+    if dead_letter:
+        print(f"  {len(dead_letter):,} points failed -> {DEAD_LETTER_PATH} "
+              f"(re-run with --retry-failed)")
+
+    write_columnar(store, points)
 
     # Summary
     print(f"\n{'='*60}")
@@ -253,25 +989,22 @@ def main():
     print(f"  Points WITH embeddings:      {with_emb:,}")
     print(f"  Points missing embeddings:   {written - with_emb:,}")
     print(f"  Output: {OUTPUT_PATH}")
+    print(f"  Binary: {EMB_NPY_PATH} (+ {os.path.basename(EMB_META_PATH)})")
 
     # Cloud cover summary
-    all_cloudy = [
-        cloud_results[s]["cloud_mean_prob"]
-        for s in cloud_results
-        if cloud_results[s].get("cloud_mean_prob") is not None
-    ]
-    if all_cloudy:
-        avg_cloud = sum(all_cloudy) / len(all_cloudy)
+    all_cloudy = store.column("cloud_mean_prob")
+    all_cloudy = all_cloudy[~np.isnan(all_cloudy)]
+    if len(all_cloudy):
         print(f"\n  Cloud Cover Analysis (Dec 2024):")
         print(f"    Points with cloud data:   {len(all_cloudy):,}")
-        print(f"    Mean cloud probability:   {avg_cloud:.1f}%")
-        print(f"    Min cloud probability:    {min(all_cloudy):.1f}%")
-        print(f"    Max cloud probability:    {max(all_cloudy):.1f}%")
+        print(f"    Mean cloud probability:   {all_cloudy.mean():.1f}%")
+        print(f"    Min cloud probability:    {all_cloudy.min():.1f}%")
+        print(f"    Max cloud probability:    {all_cloudy.max():.1f}%")
 
         # Distribution buckets
-        low = sum(1 for c in all_cloudy if c < 20)
-        mid = sum(1 for c in all_cloudy if 20 <= c < 50)
-        high = sum(1 for c in all_cloudy if c >= 50)
+        low = int((all_cloudy < 20).sum())
+        mid = int(((all_cloudy >= 20) & (all_cloudy < 50)).sum())
+        high = int((all_cloudy >= 50).sum())
         print(f"    Low cloud (<20%):         {low:,} ({low/len(all_cloudy)*100:.1f}%)")
         print(f"    Medium cloud (20-50%):    {mid:,} ({mid/len(all_cloudy)*100:.1f}%)")
         print(f"    High cloud (>50%):        {high:,} ({high/len(all_cloudy)*100:.1f}%)")
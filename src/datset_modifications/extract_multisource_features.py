@@ -2,26 +2,76 @@
 Extract multi-source features (Sentinel-2, Sentinel-1, DEM) for binned points.
 Uses cloud masking logic adapted from Landsat 8 script for Sentinel-2 via S2 Cloud Probability.
 
+Each source is sampled in concurrent, adaptively sized batches, cached per
+pixel under a key of its parameters, so a run only requests the sources or
+points that changed; spectral indices are computed locally from the raw S2
+bands when the output is written.
+
+Options:
+  --retry-failed          re-extract only the SNos in the dead-letter CSV
+  --sampler METHOD        Earth Engine point-sampling backend (ee_sampling)
+  --order ORDER           order points are batched in (input, hilbert, zorder)
+  --seasons [SEASON ...]  seasonal S2/S1 composites stacked per source
+  --season-year YEAR      year the seasons are taken from
+  --parquet               also write the output table as Parquet (needs pyarrow)
+
 This script is on STANDBY and will not be run during the initial baseline modeling phase.
 """
 
+import argparse
 import csv
+import itertools
+import json
 import os
-import time
-import ee
+
+import numpy as np
+
+from ee_backend import ee
+from batch_dispatch import AdaptiveBatcher, TokenBucket, dispatch_batches
+from ee_retry import (
+    RetryBudget, call_with_retry, read_dead_letter, worth_splitting, write_dead_letter,
+)
+from ee_region import bounded, clipped, report_collection_sizes, study_area
+from ee_sampling import SAMPLING_METHODS, sample_points
+from extraction_metrics import RunMetrics
+from pixel_cache import PixelCache, make_namespace
+from pixel_grid import POINT_ORDERS, dedupe_points, fan_out, pixel_keys, spatial_order
+from result_store import ResultStore, format_value
+from spectral_indices import SPECTRAL_INDICES, compute_indices
 
 # ── Configuration ──────────────────────────────────────────────────────────
 EE_PROJECT = "gis-hub-464402"
 BASE = r"c:\Users\Kdixter\Desktop\GIS_Analysis_Final\raw_data\dataset_1"
 INPUT_PATH = os.path.join(BASE, "dataset_1_binned.csv")
 OUTPUT_PATH = os.path.join(BASE, "dataset_1_multisource.csv")
-
-BATCH_SIZE = 2000
+DEAD_LETTER_PATH = os.path.join(BASE, "dataset_1_multisource.failed.csv")
+SEASONAL_OUTPUT_PATH = os.path.join(BASE, "dataset_1_multisource_seasonal.csv")
+SEASONAL_DEAD_LETTER_PATH = os.path.join(BASE, "dataset_1_multisource_seasonal.failed.csv")
+METRICS_PATH = os.path.join(BASE, "dataset_1_multisource.metrics.jsonl")
+CACHE_PATH = os.path.join(os.path.dirname(BASE), "pixel_cache.sqlite")
+CACHE_MAX_ENTRIES = 2_000_000  # Least recently used pixels evicted beyond this
+
+BATCH_SIZE = 2000  # Starting batch size; adapted during the run
+MIN_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 5000
+TARGET_BATCH_LATENCY_S = 60.0  # Grow batches while requests finish faster
+MAX_CONCURRENT_REQUESTS = 4  # Batches in flight at once
+REQUESTS_PER_SECOND = 1.0  # New batches started per second
+SAMPLING_METHOD = "mapped"  # One of ee_sampling.SAMPLING_METHODS
+POINT_ORDER = "hilbert"  # Request order: one of pixel_grid.POINT_ORDERS
+PIXEL_SCALE = 10  # Pixel size (m) used to deduplicate and cache points
+MAX_ATTEMPTS = 5  # Per request, including the first try
+RETRY_BASE_DELAY_S = 2.0  # Backoff: U(0, min(max, base * 2**attempt))
+RETRY_MAX_DELAY_S = 60.0
+RETRY_BUDGET = 200  # Total retries allowed across the whole run
+WRITE_CHUNK_ROWS = 50_000  # Input rows joined and written per chunk
 
 # Sentinel-2 with cloud probability
 S2_COLLECTION = "COPERNICUS/S2_SR_HARMONIZED"
 S2_CLOUD_PROB = "COPERNICUS/S2_CLOUD_PROBABILITY"
 MAX_CLOUD_PROB = 30  # Threshold for masking clouds
+S2_BANDS = ['B2', 'B3', 'B4', 'B8', 'B11', 'B12']  # Sampled raw, x 0.0001
+INDEX_NAMES = list(SPECTRAL_INDICES)  # Computed locally from S2_BANDS
 
 # Sentinel-1 SAR
 S1_COLLECTION = "COPERNICUS/S1_GRD"
@@ -29,6 +79,31 @@ S1_COLLECTION = "COPERNICUS/S1_GRD"
 # DEM (NASADEM)
 DEM_COLLECTION = "NASA/NASADEM_HGT/001"
 
+START_DATE, END_DATE = "2024-01-01", "2025-01-01"
+
+# Sources are extracted and cached independently; changing a parameter
+# re-requests only that source
+SOURCES = {
+    "s2": {"collection": S2_COLLECTION, "cloud_collection": S2_CLOUD_PROB,
+           "start": START_DATE, "end": END_DATE, "max_cloud_prob": MAX_CLOUD_PROB},
+    "s1": {"collection": S1_COLLECTION, "start": START_DATE, "end": END_DATE},
+    "dem": {"collection": DEM_COLLECTION},
+}
+SOURCE_BANDS = {
+    "s2": S2_BANDS + ["quality_score"],
+    "s1": ["VV", "VH", "VV_minus_VH"],
+    "dem": ["elevation", "slope", "aspect"],
+}
+
+# Seasonal composites (--seasons): (start, end) month-day within SEASON_YEAR
+SEASON_YEAR = 2024
+SEASONS = {
+    "premonsoon": ("03-01", "06-01"),  # Mar-May: dry, pre-planting
+    "monsoon": ("06-01", "10-01"),  # Jun-Sep: rice, peak vegetation
+    "postmonsoon": ("10-01", "12-01"),  # Oct-Nov: harvest, jhum clearing
+}
+SEASONAL_SOURCES = ("s2", "s1")
+
 
 def init_ee():
     """Initialize Earth Engine."""
@@ -36,27 +111,34 @@ def init_ee():
     print("Earth Engine initialized.")
 
 
-def get_s2_cloud_masked(start_date, end_date):
-    """Get Cloud-masked Sentinel-2 composite over given date range."""
-    # 1. Join S2 SR with Cloud Probability
-    s2_sr = ee.ImageCollection(S2_COLLECTION).filterDate(start_date, end_date)
-    s2_clouds = ee.ImageCollection(S2_CLOUD_PROB).filterDate(start_date, end_date)
+def get_s2_joined(start_date, end_date, region=None):
+    """S2 SR scenes joined with their cloud probability image, within region."""
+    s2_sr = bounded(ee.ImageCollection(S2_COLLECTION).filterDate(start_date, end_date), region)
+    s2_clouds = bounded(
+        ee.ImageCollection(S2_CLOUD_PROB).filterDate(start_date, end_date), region
+    )
 
     # Join based on system:time_start
     inner_join = ee.Join.inner()
     join_filter = ee.Filter.equals(
         leftField="system:time_start", rightField="system:time_start"
     )
-    joined = inner_join.apply(s2_sr, s2_clouds, join_filter)
+    return inner_join.apply(s2_sr, s2_clouds, join_filter)
+
+
+def get_s2_cloud_masked(start_date, end_date, region=None, max_cloud_prob=MAX_CLOUD_PROB):
+    """Get Cloud-masked Sentinel-2 composite over given date range."""
+    # 1. Join S2 SR with Cloud Probability
+    joined = get_s2_joined(start_date, end_date, region)
 
     def mask_clouds(feature):
         img = ee.Image(feature.get('primary'))
         cld = ee.Image(feature.get('secondary')).select('probability')
-        # Mask out pixels where cloud probability is higher than MAX_CLOUD_PROB
-        mask = cld.lt(MAX_CLOUD_PROB)
+        # Mask out pixels where cloud probability is higher than max_cloud_prob
+        mask = cld.lt(max_cloud_prob)
         
         # Scale the optical bands (B2-B8, B11, B12)
-        optical = img.select(['B2', 'B3', 'B4', 'B8', 'B11', 'B12']).multiply(0.0001)
+        optical = img.select(S2_BANDS).multiply(0.0001)
         
         # Quality band: favor low cloud probability (100 - probability)
         quality = ee.Image.constant(100).subtract(cld).rename('quality_score')
@@ -66,43 +148,25 @@ def get_s2_cloud_masked(start_date, end_date):
     s2_clean = ee.ImageCollection(joined.map(mask_clouds))
     
     # 2. Quality Mosaic - favor clearest pixels
+    # Raw bands only: indices are computed locally (spectral_indices.py)
     s2_mosaic = s2_clean.qualityMosaic('quality_score')
 
-    # 3. Add Indices
-    # B2=Blue, B3=Green, B4=Red, B8=NIR, B11=SWIR1, B12=SWIR2
-    s2_indices = s2_mosaic.addBands([
-        s2_mosaic.normalizedDifference(['B8', 'B4']).rename('NDVI'),
-        s2_mosaic.normalizedDifference(['B8', 'B11']).rename('NDWI'),
-        s2_mosaic.normalizedDifference(['B3', 'B11']).rename('MNDWI'),
-        s2_mosaic.expression(
-            '2.5 * ((NIR - RED) / (NIR + 6 * RED - 7.5 * BLUE + 1))',
-            {
-                'NIR': s2_mosaic.select('B8'),
-                'RED': s2_mosaic.select('B4'),
-                'BLUE': s2_mosaic.select('B2')
-            }
-        ).rename('EVI'),
-        s2_mosaic.expression(
-            '1.5 * (NIR - RED) / (0.5 + NIR + RED)',
-            {
-                'NIR': s2_mosaic.select('B8'),
-                'RED': s2_mosaic.select('B4')
-            }
-        ).rename('SAVI')
-    ])
-    
-    return s2_indices
+    return clipped(s2_mosaic, region)
 
 
-def get_s1_composite(start_date, end_date):
-    """Get Sentinel-1 SAR composite (Ascending & Descending)."""
-    s1 = (
-        ee.ImageCollection(S1_COLLECTION)
-        .filterDate(start_date, end_date)
+def get_s1_collection(start_date, end_date, region=None):
+    """Dual-polarisation IW Sentinel-1 scenes within region."""
+    return (
+        bounded(ee.ImageCollection(S1_COLLECTION).filterDate(start_date, end_date), region)
         .filter(ee.Filter.listContains('transmitterReceiverPolarisation', 'VV'))
         .filter(ee.Filter.listContains('transmitterReceiverPolarisation', 'VH'))
         .filter(ee.Filter.eq('instrumentMode', 'IW'))
     )
+
+
+def get_s1_composite(start_date, end_date, region=None):
+    """Get Sentinel-1 SAR composite (Ascending & Descending)."""
+    s1 = get_s1_collection(start_date, end_date, region)
     
     # Take median to smooth speckle noise
     vv = s1.select('VV').median()
@@ -111,12 +175,15 @@ def get_s1_composite(start_date, end_date):
     # Add ratio
     ratio = vv.subtract(vh).rename('VV_minus_VH')  # in dB, subtraction is division
     
-    return vv.addBands(vh).addBands(ratio)
+    return clipped(vv.addBands(vh).addBands(ratio), region)
 
 
-def get_dem_features():
-    """Get Elevation, Slope, and Aspect from NASADEM."""
-    dem = ee.Image(DEM_COLLECTION).select('elevation')
+def get_dem_features(region=None):
+    """
+    Get Elevation, Slope, and Aspect from NASADEM. TPI, TWI and SPI need flow
+    accumulation and are computed locally by dem_terrain.py.
+    """
+    dem = clipped(ee.Image(DEM_COLLECTION).select('elevation'), region)
     slope = ee.Terrain.slope(dem).rename('slope')
     aspect = ee.Terrain.aspect(dem).rename('aspect')
     return dem.addBands([slope, aspect])
@@ -139,90 +206,366 @@ def load_points(path):
     return points
 
 
+def source_specs(seasons=None, year=SEASON_YEAR):
+    """
+    ({name: params}, {name: bands}) of every source. With `seasons`, S2 and
+    S1 become stacks of one composite per season, band names suffixed
+    "_<season>".
+    """
+    params = {name: dict(p) for name, p in SOURCES.items()}
+    bands = {name: list(b) for name, b in SOURCE_BANDS.items()}
+    if seasons:
+        for name in SEASONAL_SOURCES:
+            params[name].pop("start")
+            params[name].pop("end")
+            params[name]["seasons"] = {
+                season: [f"{year}-{SEASONS[season][0]}", f"{year}-{SEASONS[season][1]}"]
+                for season in seasons
+            }
+            bands[name] = [f"{b}_{season}" for season in seasons
+                           for b in SOURCE_BANDS[name]]
+    return params, bands
+
+
+def source_windows(params):
+    """[(suffix, start, end)]: one date window per composite of a source."""
+    if "seasons" in params:
+        return [(f"_{season}", start, end)
+                for season, (start, end) in params["seasons"].items()]
+    return [("", params["start"], params["end"])]
+
+
+def source_version(name, params, bands):
+    """
+    Cache namespace of a source: its name, parameters and band list, plus the
+    sampling grid (UTM per zone) so values sampled on another grid are not reused.
+    """
+    return make_namespace("multisource", name, json.dumps(params, sort_keys=True),
+                          "utm", bands=bands)
+
+
+def source_collections(name, params, region):
+    """{label: collection} behind a source's composites (for size reports)."""
+    collections = {}
+    if name not in ("s2", "s1"):
+        return collections
+    for suffix, start, end in source_windows(params):
+        season = f" {suffix[1:]}" if suffix else ""
+        if name == "s2":
+            collections["S2 SR x cloud prob. join" + season] = (
+                get_s2_joined(start, end, region))
+        else:
+            collections["S1 GRD (IW, VV+VH)" + season] = get_s1_collection(start, end, region)
+    return collections
+
+
+def build_source_image(name, params, region):
+    """
+    ee.Image of one source with exactly SOURCE_BANDS[name], or for seasonal
+    sources every season's composite renamed with its suffix and stacked.
+    """
+    if name == "dem":
+        return get_dem_features(region).select(SOURCE_BANDS[name])
+    images = []
+    for suffix, start, end in source_windows(params):
+        if name == "s2":
+            image = get_s2_cloud_masked(start, end, region, params["max_cloud_prob"])
+        else:
+            image = get_s1_composite(start, end, region)
+        images.append(image.select(SOURCE_BANDS[name])
+                      .rename([b + suffix for b in SOURCE_BANDS[name]]))
+    return images[0].addBands(images[1:]) if len(images) > 1 else images[0]
+
+
+def s2_indices(s2_values, s2_bands):
+    """
+    Spectral indices of every S2 composite in the column (one per season in
+    seasonal mode). Returns (index column names, float32 matrix).
+    """
+    names, blocks = [], []
+    suffixes = [b[len("B2"):] for b in s2_bands if b == "B2" or b.startswith("B2_")]
+    for suffix in suffixes:
+        cols = [s2_bands.index(b + suffix) for b in S2_BANDS]
+        blocks.append(compute_indices(s2_values[:, cols], S2_BANDS, INDEX_NAMES))
+        names.extend(n + suffix for n in INDEX_NAMES)
+    return names, np.hstack(blocks)
+
+
+def extract_source(name, params, bands, points, store, cache, metrics, dead_letter,
+                   order=POINT_ORDER, method=SAMPLING_METHOD):
+    """
+    Fill store column `name` (the source's `bands`) for every point: cached
+    pixels first, then one batched extraction of the misses. Failed points go
+    to `dead_letter`. Returns the number of pixels requested.
+    """
+    ns = source_version(name, params, bands)
+
+    unique, pixel_groups = dedupe_points(points, PIXEL_SCALE)
+    rep_keys = dict(zip(
+        (p["SNo"] for p in unique),
+        pixel_keys([p["lat"] for p in unique], [p["lon"] for p in unique], PIXEL_SCALE),
+    ))
+    cached = cache.get_many(ns, rep_keys.values())
+    hits = {sno: cached[key] for sno, key in rep_keys.items() if key in cached}
+    for sno, values in fan_out(hits, pixel_groups).items():
+        store.put(sno, name, values)
+    misses = spatial_order([p for p in unique if p["SNo"] not in hits], order)
+    metrics.cache(len(hits), len(misses))
+    print(f"\n[{name}] " + ", ".join(f"{k}={v}" for k, v in params.items()))
+    print(f"  {len(unique):,} pixels: {len(hits):,} cached, {len(misses):,} to request")
+    if not misses:
+        return 0
+
+    # Bound every collection to the points' study area
+    region = study_area(misses)
+    collections = source_collections(name, params, region)
+    if collections:
+        report_collection_sizes(collections)
+    image = build_source_image(name, params, region)
+
+    # Process in adaptively sized batches via `method`,
+    # several batches in flight; failing batches are bisected and retried
+    batcher = AdaptiveBatcher(
+        misses, BATCH_SIZE,
+        min_size=MIN_BATCH_SIZE,
+        max_size=MAX_BATCH_SIZE,
+        target_latency_s=TARGET_BATCH_LATENCY_S,
+    )
+    limiter = TokenBucket(REQUESTS_PER_SECOND, burst=MAX_CONCURRENT_REQUESTS)
+    budget = RetryBudget(RETRY_BUDGET)
+
+    def worker(batch):
+        return call_with_retry(
+            sample_points, batch, image, method, bands,
+            max_attempts=MAX_ATTEMPTS,
+            base_delay_s=RETRY_BASE_DELAY_S,
+            max_delay_s=RETRY_MAX_DELAY_S,
+            budget=budget,
+        )
+
+    for batch_idx, batch, result, error, elapsed in dispatch_batches(
+        batcher, worker, MAX_CONCURRENT_REQUESTS, limiter
+    ):
+        print(f"  Batch {batch_idx + 1} ({len(batch)} points)...", end=" ")
+        # Transient errors that survived the retries are not worth splitting
+        status = batcher.report(batch_idx, batch, error is None, elapsed,
+                                error=error, split=worth_splitting(error))
+        if error is not None:
+            print(f"\n    WARNING: Extraction failed: {error} -> {status}", end=" ")
+            failed = 0
+            if status == "failed":
+                for p in batch:
+                    for sno in pixel_groups[p["SNo"]]:
+                        dead_letter[sno] = (p, f"{name}: {error}")
+                        failed += 1
+            metrics.batch(f"{name}:{batch_idx}", status, len(batch), elapsed,
+                          failed=failed)
+        else:
+            sampled_info, retries = result
+            features = sampled_info.get("features", [])
+            pixel_values = {}
+            for feat in features:
+                props = feat["properties"]
+                pixel_values[str(props.get("SNo", ""))] = [props.get(b) for b in bands]
+            cache.put_many(ns, {rep_keys[sno]: v for sno, v in pixel_values.items()})
+            filled = fan_out(pixel_values, pixel_groups)
+            for sno, values in filled.items():
+                store.put(sno, name, values)
+            metrics.batch(
+                f"{name}:{batch_idx}", "ok", len(batch), elapsed, snos=len(filled),
+                retries=retries, with_data=len(filled),
+                reply_bytes=len(json.dumps(sampled_info, separators=(",", ":"))),
+            )
+        print(f"done ({elapsed:.1f}s) [next size {batcher.size}]")
+
+    print(f"  Batching: {batcher.summary()} | "
+          f"retry budget left: {budget.remaining}/{RETRY_BUDGET}")
+    return len(misses)
+
+
+def read_chunks(reader, chunk_rows):
+    """Lists of up to chunk_rows rows from a csv.reader."""
+    while True:
+        rows = list(itertools.islice(reader, chunk_rows))
+        if not rows:
+            return
+        yield rows
+
+
+class _ParquetChunks:
+    """Appends one row group per chunk under a fixed schema (needs pyarrow)."""
+
+    FLOAT_COLUMNS = ("lat", "lon")
+
+    def __init__(self, path, base_header, band_names):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self.base_header = base_header
+        self.schema = pa.schema(
+            [(h, pa.float64() if h in self.FLOAT_COLUMNS else pa.string())
+             for h in base_header]
+            + [(b, pa.float32()) for b in band_names]
+        )
+        self._writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, base_columns, values):
+        pa = self._pa
+        arrays = []
+        for h, cells in zip(self.base_header, base_columns):
+            if h in self.FLOAT_COLUMNS:
+                arrays.append(pa.array([float(c) if c else None for c in cells], pa.float64()))
+            else:
+                arrays.append(pa.array(cells, pa.string()))
+        arrays.extend(pa.array(values[:, j], pa.float32(), mask=np.isnan(values[:, j]))
+                      for j in range(values.shape[1]))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def write_output(base_path, output_path, store, columns, parquet_path=None,
+                 chunk_rows=WRITE_CHUNK_ROWS):
+    """
+    Streaming merge join of a base CSV with the result store by SNo.
+
+    The output schema is fixed up front: the base columns, then every column
+    of `columns` ([(names, (n, len(names)) array)], rows in store order).
+    Band columns already present in the base (a previous output) are
+    replaced; rows whose SNo is not in the store keep those values. The base
+    is read and written chunk_rows rows at a time, to a temporary file that
+    replaces output_path at the end, so memory does not grow with the input
+    and output_path may also be the base. Optionally writes the same table to
+    a Parquet file, one row group per chunk.
+    Returns (rows written, rows joined with the store).
+    """
+    band_names = [b for names, _ in columns for b in names]
+    tmp_path = output_path + ".tmp"
+    parquet = None
+    n_rows = n_joined = 0
+    with open(base_path, "r", encoding="utf-8") as fin, \
+            open(tmp_path, "w", encoding="utf-8", newline="") as fout:
+        reader = csv.reader(fin)
+        header = next(reader)
+        sno_col = header.index("SNo")
+        base_cols = [i for i, h in enumerate(header) if h not in band_names]
+        base_header = [header[i] for i in base_cols]
+        existing = [(j, header.index(b)) for j, b in enumerate(band_names) if b in header]
+        writer = csv.writer(fout)
+        writer.writerow(base_header + band_names)
+        if parquet_path:
+            parquet = _ParquetChunks(parquet_path + ".tmp", base_header, band_names)
+
+        for rows in read_chunks(reader, chunk_rows):
+            values = np.full((len(rows), len(band_names)), np.nan, dtype=np.float32)
+            for j, i in existing:
+                values[:, j] = [float(r[i]) if r[i] else np.nan for r in rows]
+            idx = np.array([store.index.get(r[sno_col], -1) for r in rows], dtype=np.int64)
+            hit = idx >= 0
+            if hit.any():
+                values[hit] = np.hstack([arr[idx[hit]].reshape(int(hit.sum()), -1)
+                                         for _, arr in columns])
+            base = [[r[i] for i in base_cols] for r in rows]
+            for cells, vals in zip(base, values):
+                writer.writerow(cells + [format_value(v) for v in vals])
+            if parquet is not None:
+                parquet.write(list(zip(*base)), values)
+            n_rows += len(rows)
+            n_joined += int(hit.sum())
+    if parquet is not None:
+        parquet.close()
+        os.replace(parquet_path + ".tmp", parquet_path)
+    os.replace(tmp_path, output_path)
+    return n_rows, n_joined
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Re-extract only the SNos in the dead-letter file and "
+                             "update them in the existing output")
+    parser.add_argument("--sampler", choices=SAMPLING_METHODS, default=SAMPLING_METHOD,
+                        help="Earth Engine point-sampling backend")
+    parser.add_argument("--order", choices=POINT_ORDERS, default=POINT_ORDER,
+                        help="Order points are batched in (output order is unchanged)")
+    parser.add_argument("--seasons", nargs="*", choices=list(SEASONS), metavar="SEASON",
+                        help="Seasonal S2/S1 composites, one band-suffixed stack per "
+                             f"source (no names: all of {', '.join(SEASONS)})")
+    parser.add_argument("--season-year", type=int, default=SEASON_YEAR,
+                        help="Year the seasons are taken from")
+    parser.add_argument("--parquet", action="store_true",
+                        help="Also write the output table as Parquet (needs pyarrow)")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+    if args.parquet:
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise SystemExit("--parquet needs pyarrow (pip install pyarrow)") from None
+
+    # Seasonal mode keeps its own output and dead letter (different columns)
+    seasons = None
+    output_path, dead_letter_path = OUTPUT_PATH, DEAD_LETTER_PATH
+    if args.seasons is not None:
+        seasons = [s for s in SEASONS if s in args.seasons] if args.seasons else list(SEASONS)
+        output_path, dead_letter_path = SEASONAL_OUTPUT_PATH, SEASONAL_DEAD_LETTER_PATH
+        print(f"Seasonal mode ({args.season_year}): {', '.join(seasons)}")
+    if args.retry_failed and not os.path.exists(output_path):
+        # Retried rows are merged into the existing output, so it must exist
+        raise SystemExit(f"--retry-failed needs an existing output to merge into; "
+                         f"{output_path} not found (run without --retry-failed first)")
     init_ee()
+    params, source_bands = source_specs(seasons, args.season_year)
 
     points = load_points(INPUT_PATH)
     print(f"Loaded {len(points):,} points.")
-
-    # 1. Build Multi-Source Image Stack (2024)
-    print("Building Multi-Source Stack...")
-    start, end = "2024-01-01", "2025-01-01"
-    
-    s2_feat = get_s2_cloud_masked(start, end)
-    s1_feat = get_s1_composite(start, end)
-    dem_feat = get_dem_features()
-    
-    multi_stack = s2_feat.addBands([s1_feat, dem_feat])
-    
-    band_names = multi_stack.bandNames().getInfo()
-    print(f"Bands ({len(band_names)}): {band_names}")
-
-    # Process in batches via mapped reduceRegion
-    total_batches = (len(points) + BATCH_SIZE - 1) // BATCH_SIZE
-    print(f"Processing {total_batches} batches...")
-
-    feature_results = {}
-
-    for batch_idx in range(total_batches):
-        start_idx = batch_idx * BATCH_SIZE
-        end_idx = min(start_idx + BATCH_SIZE, len(points))
-        batch = points[start_idx:end_idx]
-        print(f"  Batch {batch_idx + 1}/{total_batches}...", end=" ", flush=True)
-
-        t0 = time.time()
-
-        features = []
-        for p in batch:
-            geom = ee.Geometry.Point([p["lon"], p["lat"]])
-            feat = ee.Feature(geom, {"SNo": p["SNo"]})
-            features.append(feat)
-
-        fc = ee.FeatureCollection(features)
-
-        def sample_stack(feature):
-            vals = multi_stack.reduceRegion(
-                reducer=ee.Reducer.first(),
-                geometry=feature.geometry(),
-                scale=10,
-            )
-            return feature.set(vals)
-
-        try:
-            sampled_info = fc.map(sample_stack).getInfo()
-            for feat in sampled_info.get("features", []):
-                props = feat["properties"]
-                sno = str(props.get("SNo", ""))
-                feature_results[sno] = {b: props.get(b) for b in band_names}
-        except Exception as e:
-            print(f"\n    WARNING: Extraction failed: {e}")
-
-        elapsed = time.time() - t0
-        print(f"done ({elapsed:.1f}s)")
-
-        if batch_idx < total_batches - 1:
-            time.sleep(1)
-
-    # 2. Append to original CSV
-    print(f"\nAppending results to {OUTPUT_PATH}...")
-    
-    # Read original
-    with open(INPUT_PATH, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        header = reader.fieldnames
-        all_rows = list(reader)
-
-    out_header = header + band_names
-    
-    with open(OUTPUT_PATH, "w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=out_header, extrasaction='ignore')
-        writer.writeheader()
-        
-        for row in all_rows:
-            sno = row["SNo"]
-            feats = feature_results.get(sno, {})
-            row.update(feats)
-            writer.writerow(row)
+    if args.retry_failed:
+        failed_snos = read_dead_letter(dead_letter_path)
+        points = [p for p in points if p["SNo"] in failed_snos]
+        print(f"Retry-failed mode: {len(points):,} dead-lettered points to extract.")
+
+    # 1. Extract each source independently (cached per source version)
+    store = ResultStore([p["SNo"] for p in points],
+                        {name: len(bands) for name, bands in source_bands.items()})
+    cache = PixelCache(CACHE_PATH, CACHE_MAX_ENTRIES)
+    dead_letter = {}
+    with RunMetrics(METRICS_PATH) as metrics:
+        requested = {
+            name: extract_source(name, params[name], source_bands[name], points, store,
+                                 cache, metrics, dead_letter, args.order, args.sampler)
+            for name in params
+        }
+        metrics.finish()
+    cache.close()
+    print("\nPixels requested per source: "
+          + ", ".join(f"{name} {n:,}" for name, n in requested.items()))
+
+    write_dead_letter(dead_letter_path, dead_letter)
+    if dead_letter:
+        print(f"  {len(dead_letter):,} points failed -> {dead_letter_path} "
+              f"(re-run with --retry-failed)")
+
+    # 2. Local column join by SNo: source arrays plus spectral indices
+    # computed from the raw S2 bands in one vectorised pass
+    index_names, indices = s2_indices(store.column("s2"), source_bands["s2"])
+    columns = [(source_bands[name], store.column(name)) for name in params]
+    columns.append((index_names, indices))
+
+    # 3. Stream the input (or, when retrying, the existing output) through
+    # the join, chunk by chunk
+    parquet_path = None
+    if args.parquet:
+        parquet_path = os.path.splitext(output_path)[0] + ".parquet"
+    base_path = output_path if args.retry_failed else INPUT_PATH
+    print(f"\nWriting {output_path}" + (f" and {parquet_path}" if parquet_path else "")
+          + "...")
+    n_rows, n_joined = write_output(base_path, output_path, store, columns, parquet_path)
+    print(f"  {n_rows:,} rows written, {n_joined:,} joined with extracted values")
 
     print("DONE.")
 
@@ -0,0 +1,87 @@
+"""
+Append-only per-batch journal for resumable Earth Engine extraction.
+
+Every finished batch appends one JSON line:
+  {"batch": 17, "sno_first": "...", "sno_last": "...", "n_points": 2000,
+   "status": "ok" | "split" | "failed", "results": {SNo: {...}},
+   "error": "...", ...extra fields such as "elapsed_s"}
+
+The file is flushed and fsync'd after every record, so a crash can lose at
+most the batch that was in flight. On a re-run the journal is replayed and
+only points that never reached an "ok" record are sent to Earth Engine again.
+"""
+
+import json
+import os
+
+
+class ExtractionJournal:
+    """Append-only JSONL journal of batch outcomes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = None
+
+    def replay(self):
+        """
+        Read the journal and yield (SNo, result) for every point whose batch
+        completed with status "ok". Records are yielded in file order, so later
+        records override earlier ones when stored by SNo. A truncated trailing
+        line (crash mid-write) is ignored.
+        """
+        if not os.path.exists(self.path):
+            return
+        n_ok = n_failed = n_bad = n_points = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    n_bad += 1
+                    continue
+                if record.get("status") == "ok":
+                    n_ok += 1
+                    results = record.get("results", {})
+                    n_points += len(results)
+                    yield from results.items()
+                else:
+                    n_failed += 1
+        print(f"Journal replay: {n_ok} ok / {n_failed} failed batch records, "
+              f"{n_points:,} point results recovered"
+              + (f" ({n_bad} unreadable lines skipped)" if n_bad else ""))
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, batch_id, snos, status, results=None, error=None, **extra):
+        """Append one batch record and force it to disk."""
+        entry = {
+            "batch": batch_id,
+            "sno_first": snos[0] if snos else None,
+            "sno_last": snos[-1] if snos else None,
+            "n_points": len(snos),
+            "status": status,
+            "results": results or {},
+        }
+        if error is not None:
+            entry["error"] = str(error)
+        entry.update(extra)
+        self._fh.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
@@ -0,0 +1,124 @@
+"""
+Per-batch telemetry for the extraction scripts, written as JSONL.
+
+Every record is one JSON line with an "event" field:
+  {"event": "batch", "batch": 17, "status": "ok" | "split" | "failed",
+   "points": 2000, "snos": 2210, "latency_s": 4.2, "reply_bytes": 1048576,
+   "retries": 1, "failed": 0, "t": 12.3}
+  {"event": "cache", "hits": 5000, "misses": 12000, "t": 0.4}
+  {"event": "summary", ...RunMetrics.summary()}
+
+Totals (points, bytes, retries, failures, points with data) are updated as
+each batch is recorded, so progress lines never rescan the results. Latency
+percentiles are computed once, from the recorded latencies, at the end.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+
+class RunMetrics:
+    """Incremental run counters plus a JSONL sink of per-batch records."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fh = None
+        self._t0 = time.time()
+        self.latencies = []  # Seconds per successful batch
+        self.n_batches = 0
+        self.n_ok = 0
+        self.points = 0  # Points requested in successful batches
+        self.snos = 0  # Output rows filled by those batches (after fan-out)
+        self.reply_bytes = 0
+        self.retries = 0
+        self.failed = 0  # Output rows given up on
+        self.cache_hits = 0
+        self.with_data = 0  # Output rows that received values, any source
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8")
+        self._t0 = time.time()
+        return self
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self, entry):
+        entry["t"] = round(time.time() - self._t0, 3)
+        if self._fh is not None:
+            self._fh.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._fh.flush()
+
+    def cache(self, hits, misses):
+        """Record the pixel-cache lookup that precedes batching."""
+        self.cache_hits += hits
+        self._write({"event": "cache", "hits": hits, "misses": misses})
+
+    def batch(self, batch_id, status, points, latency_s, snos=None, reply_bytes=0,
+              retries=0, failed=0, with_data=0):
+        """Record one finished batch and update the running totals."""
+        self.n_batches += 1
+        self.retries += retries
+        self.failed += failed
+        if status == "ok":
+            self.n_ok += 1
+            self.latencies.append(latency_s)
+            self.points += points
+            self.snos += points if snos is None else snos
+            self.reply_bytes += reply_bytes
+            self.with_data += with_data
+        self._write({
+            "event": "batch",
+            "batch": batch_id,
+            "status": status,
+            "points": points,
+            "snos": points if snos is None else snos,
+            "latency_s": round(latency_s, 3),
+            "reply_bytes": reply_bytes,
+            "retries": retries,
+            "failed": failed,
+        })
+
+    def summary(self):
+        """Totals, throughput and latency percentiles for the run so far."""
+        elapsed = time.time() - self._t0
+        lat = np.asarray(self.latencies, dtype=np.float64)
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99]) if len(lat) else (0.0,) * 3
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "batches": self.n_batches,
+            "batches_ok": self.n_ok,
+            "points": self.points,
+            "snos": self.snos,
+            "points_per_s": round(self.points / elapsed, 1) if elapsed > 0 else 0.0,
+            "reply_bytes": self.reply_bytes,
+            "retries": self.retries,
+            "failed": self.failed,
+            "cache_hits": self.cache_hits,
+            "latency_p50_s": round(float(p50), 3),
+            "latency_p95_s": round(float(p95), 3),
+            "latency_p99_s": round(float(p99), 3),
+        }
+
+    def finish(self):
+        """Write the summary record and print it. Returns the summary."""
+        s = self.summary()
+        self._write(dict(event="summary", **s))
+        print(f"Telemetry: {s['points']:,} points in {s['elapsed_s']:.1f}s "
+              f"({s['points_per_s']:,.1f} pts/s) | batch latency "
+              f"p50 {s['latency_p50_s']:.2f}s, p95 {s['latency_p95_s']:.2f}s, "
+              f"p99 {s['latency_p99_s']:.2f}s | {s['reply_bytes'] / 1e6:.1f} MB, "
+              f"{s['retries']} retries, {s['failed']:,} failed -> {self.path}")
+        return s
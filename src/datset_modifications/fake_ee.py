@@ -0,0 +1,600 @@
+"""
+Offline stand-in for the subset of the `ee` API used by the extraction scripts.
+
+Nothing is computed lazily: FeatureCollection.map() evaluates the mapped
+function eagerly and every getInfo() call sleeps for LATENCY seconds to mimic
+a server round trip. Pixel values are deterministic functions of
+(collection, dates, band, lon, lat), so two runs over the same points agree.
+Synthetic bands exist for the Satellite Embedding, S2 SR, S2 cloud
+probability, S1 GRD and NASADEM collections.
+
+Server behaviour that the throughput code has to cope with can be simulated:
+  - LATENCY:       seconds slept per getInfo()
+  - TILE_LATENCY:  extra seconds per distinct TILE_DEG x TILE_DEG tile the
+                   request's points fall in (scattered batches cost more)
+  - MAX_FEATURES:  replies with more features fail like Earth Engine's
+                   "Collection query aborted after accumulating over N elements"
+  - FAILURE_RATE:  fraction of requests failing with a transient error
+  - FAIL_SNOS:     SNos that make any request containing them (as an "SNo"
+                   feature property) fail permanently
+
+Select it with EE_BACKEND=fake (see ee_backend.py); the FAKE_EE_* environment
+variables set the options above, or call configure() directly.
+"""
+
+import math
+import os
+import random
+import threading
+import time
+import zlib
+
+LATENCY = float(os.environ.get("FAKE_EE_LATENCY", "0.5"))
+TILE_LATENCY = float(os.environ.get("FAKE_EE_TILE_LATENCY", "0.0"))
+TILE_DEG = 0.25
+MAX_FEATURES = int(os.environ.get("FAKE_EE_MAX_FEATURES", "5000"))
+FAILURE_RATE = float(os.environ.get("FAKE_EE_FAILURE_RATE", "0.0"))
+FAIL_SNOS = set(filter(None, os.environ.get("FAKE_EE_FAIL_SNOS", "").split(",")))
+
+REQUEST_COUNT = 0  # getInfo() calls made so far
+FEATURES_RETURNED = 0  # Features across all successful replies
+_STATE_LOCK = threading.Lock()
+_RNG = random.Random(0)
+
+TRANSIENT_ERRORS = (
+    "An internal error has occurred.",
+    "Quota exceeded: Too many concurrent aggregations.",
+    "HTTP 429: Too Many Requests",
+    "HTTP 503: Service Unavailable",
+)
+
+
+class EEException(Exception):
+    pass
+
+
+def configure(latency=None, max_features=None, failure_rate=None, fail_snos=None,
+              seed=0, tile_latency=None):
+    """Set simulation options and reset the request counters."""
+    global LATENCY, TILE_LATENCY, MAX_FEATURES, FAILURE_RATE, FAIL_SNOS
+    global REQUEST_COUNT, FEATURES_RETURNED, _RNG
+    if latency is not None:
+        LATENCY = latency
+    if tile_latency is not None:
+        TILE_LATENCY = tile_latency
+    if max_features is not None:
+        MAX_FEATURES = max_features
+    if failure_rate is not None:
+        FAILURE_RATE = failure_rate
+    if fail_snos is not None:
+        FAIL_SNOS = {str(s) for s in fail_snos}
+    REQUEST_COUNT = 0
+    FEATURES_RETURNED = 0
+    _RNG = random.Random(seed)
+
+
+def Initialize(project=None):
+    pass
+
+
+def _noise(seed, lon, lat):
+    """Deterministic pseudo-random value in [0, 1) for a pixel."""
+    # Snap to ~10 m so points in the same pixel get the same value
+    x = round(lon * 1e4) * 12.9898 + round(lat * 1e4) * 78.233 + seed * 0.001
+    return (math.sin(x) * 43758.5453) % 1.0
+
+
+def _seed(*parts):
+    return zlib.crc32("|".join(str(p) for p in parts).encode()) % 100000
+
+
+def _simulate_request(features=()):
+    """Count the request, sleep, then apply the injected failure rules."""
+    global REQUEST_COUNT, FEATURES_RETURNED
+    with _STATE_LOCK:
+        REQUEST_COUNT += 1
+        fail_roll = _RNG.random()
+        fail_msg = _RNG.choice(TRANSIENT_ERRORS)
+    delay = LATENCY
+    if TILE_LATENCY:
+        tiles = {
+            (math.floor(f._geom.lon / TILE_DEG), math.floor(f._geom.lat / TILE_DEG))
+            for f in features if f._geom is not None
+        }
+        delay += TILE_LATENCY * len(tiles)
+    if delay:
+        time.sleep(delay)
+    if len(features) > MAX_FEATURES:
+        raise EEException(
+            f"Collection query aborted after accumulating over {MAX_FEATURES} elements."
+        )
+    if FAIL_SNOS:
+        bad = [f.get("SNo") for f in features if str(f.get("SNo")) in FAIL_SNOS]
+        if bad:
+            raise EEException(f"Invalid point geometry for SNo {bad[0]}.")
+    if fail_roll < FAILURE_RATE:
+        raise EEException(fail_msg)
+    with _STATE_LOCK:
+        FEATURES_RETURNED += len(features)
+
+
+# ── Geometry / Feature ─────────────────────────────────────────────────────
+class _Point:
+    def __init__(self, coords):
+        self.lon, self.lat = float(coords[0]), float(coords[1])
+
+    def getInfo(self):
+        return {"type": "Point", "coordinates": [self.lon, self.lat]}
+
+
+class _Rectangle:
+    def __init__(self, coords):
+        self.west, self.south, self.east, self.north = (float(c) for c in coords)
+
+    def getInfo(self):
+        w, s, e, n = self.west, self.south, self.east, self.north
+        return {"type": "Polygon",
+                "coordinates": [[[w, s], [e, s], [e, n], [w, n], [w, s]]]}
+
+
+class Geometry:
+    @staticmethod
+    def Point(coords):
+        return _Point(coords)
+
+    @staticmethod
+    def Rectangle(coords):
+        return _Rectangle(coords)
+
+
+class Projection:
+    def __init__(self, crs):
+        self.crs = crs
+        self.scale = None
+
+    def atScale(self, scale):
+        new = Projection(self.crs)
+        new.scale = scale
+        return new
+
+
+class Feature:
+    def __init__(self, geom, props=None, export_geometry=True):
+        self._geom = geom
+        self._props = dict(props or {})
+        self._export_geometry = export_geometry
+
+    def geometry(self):
+        return self._geom
+
+    def get(self, key):
+        return self._props.get(key)
+
+    def set(self, values):
+        if isinstance(values, Dictionary):
+            values = values._values
+        new = Feature(self._geom, self._props, self._export_geometry)
+        new._props.update(values)
+        return new
+
+    def getInfo(self):
+        return {
+            "type": "Feature",
+            "geometry": (self._geom.getInfo()
+                         if self._geom is not None and self._export_geometry else None),
+            "properties": dict(self._props),
+        }
+
+
+class FeatureCollection:
+    def __init__(self, features):
+        if isinstance(features, List):
+            features = features._values
+        self._features = list(features)
+
+    def map(self, fn):
+        return FeatureCollection(fn(f) for f in self._features)
+
+    def merge(self, other):
+        return FeatureCollection(self._features + other._features)
+
+    def reduceColumns(self, reducer, selectors):
+        rows = [[f.get(s) for s in selectors] for f in self._features]
+        # toList drops rows with a null in any column
+        return _ComputedValue(
+            {"list": [r for r in rows if None not in r]}, self._features
+        )
+
+    def getInfo(self):
+        _simulate_request(self._features)
+        return {
+            "type": "FeatureCollection",
+            "features": [f.getInfo() for f in self._features],
+        }
+
+
+class Dictionary:
+    def __init__(self, values):
+        self._values = values
+
+    def get(self, key):
+        return self._values.get(key)
+
+    def getInfo(self):
+        _simulate_request()
+        return {k: v.getInfo() if hasattr(v, "getInfo") else v
+                for k, v in self._values.items()}
+
+
+class _Number:
+    def __init__(self, value):
+        self._value = value
+
+    def getInfo(self):
+        return self._value
+
+
+class _ComputedValue:
+    """A server-side result derived from `features`; getInfo() is one request."""
+
+    def __init__(self, value, features):
+        self._value = value
+        self._features = features
+
+    def getInfo(self):
+        _simulate_request(self._features)
+        return self._value
+
+
+class List:
+    def __init__(self, values):
+        self._values = list(values)
+
+    def get(self, index):
+        return self._values[int(index)]
+
+    def map(self, fn):
+        return List(fn(v) for v in self._values)
+
+    def getInfo(self):
+        return list(self._values)
+
+
+class _ClientList:
+    def __init__(self, values):
+        self._values = values
+
+    def getInfo(self):
+        return list(self._values)
+
+
+# ── Filters / reducers / joins ─────────────────────────────────────────────
+class Reducer:
+    @staticmethod
+    def first():
+        return "first"
+
+    @staticmethod
+    def toList(tuple_size=1):
+        return ("toList", tuple_size)
+
+
+class Filter:
+    @staticmethod
+    def lt(name, value):
+        return ("lt", name, value)
+
+    @staticmethod
+    def eq(name, value):
+        return ("eq", name, value)
+
+    @staticmethod
+    def listContains(name, value):
+        return ("listContains", name, value)
+
+    @staticmethod
+    def equals(leftField=None, rightField=None):
+        return ("equals", leftField, rightField)
+
+
+class _JoinedCollection:
+    """Result of Join.apply: a single (primary, secondary) composite pair."""
+
+    def __init__(self, primary, secondary):
+        self._pair = Feature(None, {
+            "primary": primary._composite(),
+            "secondary": secondary._composite(),
+        })
+        self._size = min(primary._scene_count(), secondary._scene_count())
+
+    def size(self):
+        return _Number(self._size)
+
+    def map(self, fn):
+        return _MappedImages(fn(self._pair))
+
+
+class _MappedImages:
+    def __init__(self, image):
+        self.image = image
+
+
+class Join:
+    @staticmethod
+    def inner():
+        return Join()
+
+    def apply(self, primary, secondary, condition):
+        return _JoinedCollection(primary, secondary)
+
+
+# ── Images ─────────────────────────────────────────────────────────────────
+class Image:
+    """An image is an ordered mapping of band name -> fn(lon, lat)."""
+
+    def __init__(self, bands):
+        if isinstance(bands, str):
+            bands = _collection_image(bands, None)._bands
+        elif isinstance(bands, Image):
+            bands = bands._bands
+        elif isinstance(bands, (int, float)):
+            bands = {"constant": lambda lon, lat, v=bands: v}
+        self._bands = dict(bands)
+
+    @staticmethod
+    def constant(value):
+        return Image(value)
+
+    def select(self, names):
+        if isinstance(names, str):
+            names = [names]
+        return Image((n, self._bands[n]) for n in names)
+
+    def rename(self, *names):
+        if len(names) == 1 and isinstance(names[0], (list, tuple)):
+            names = names[0]
+        return Image(zip(names, self._bands.values()))
+
+    def addBands(self, others):
+        if not isinstance(others, (list, tuple)):
+            others = [others]
+        bands = dict(self._bands)
+        for other in others:
+            bands.update(other._bands)
+        return Image(bands)
+
+    def bandNames(self):
+        return _ClientList(list(self._bands))
+
+    # Band math: scalars broadcast, single-band images broadcast, otherwise
+    # bands are paired by position (Earth Engine semantics).
+    def _binary(self, other, op):
+        if isinstance(other, (int, float)):
+            other = Image(other)
+        other_fns = list(other._bands.values())
+        out = {}
+        for i, (name, fn) in enumerate(self._bands.items()):
+            g = other_fns[0] if len(other_fns) == 1 else other_fns[i]
+            out[name] = lambda lon, lat, f=fn, g=g: op(f(lon, lat), g(lon, lat))
+        return Image(out)
+
+    def add(self, other):
+        return self._binary(other, lambda a, b: a + b)
+
+    def subtract(self, other):
+        return self._binary(other, lambda a, b: a - b)
+
+    def multiply(self, other):
+        return self._binary(other, lambda a, b: a * b)
+
+    def divide(self, other):
+        return self._binary(other, lambda a, b: a / b if b else None)
+
+    def lt(self, value):
+        return self._binary(value, lambda a, b: 1 if a < b else 0)
+
+    def updateMask(self, mask):
+        return self
+
+    def clip(self, geometry):
+        return self
+
+    def unmask(self, value=0):
+        return self
+
+    def neighborhoodToArray(self, kernel, defaultValue=0):
+        # Row 0 of each k x k array is the northern edge of the window
+        r, d = kernel.radius, _PIXEL_DEG
+        out = {}
+        for name, fn in self._bands.items():
+            out[name] = lambda lon, lat, f=fn: [
+                [f(lon + dx * d, lat - dy * d) for dx in range(-r, r + 1)]
+                for dy in range(-r, r + 1)
+            ]
+        return Image(out)
+
+    # crs / projection are accepted and ignored: values are snapped to the
+    # ~10 m degree grid of _noise() whatever the requested projection
+    def reduceRegion(self, reducer=None, geometry=None, scale=None, crs=None):
+        return Dictionary({
+            name: fn(geometry.lon, geometry.lat)
+            for name, fn in self._bands.items()
+        })
+
+    def reduceRegions(self, collection=None, reducer=None, scale=None, crs=None):
+        return collection.map(
+            lambda f: f.set(self.reduceRegion(reducer, f.geometry(), scale))
+        )
+
+    def sampleRegions(self, collection=None, properties=None, scale=None,
+                      projection=None, geometries=False):
+        out = []
+        for f in collection._features:
+            props = {k: f.get(k) for k in (properties or [])}
+            props.update(self.reduceRegion(None, f.geometry(), scale)._values)
+            out.append(Feature(f.geometry(), props, export_geometry=geometries))
+        return FeatureCollection(out)
+
+
+def _elevation(lon, lat):
+    """Smooth synthetic terrain: plains in the south-west, peaks to the north."""
+    return max(50.0, 150.0 + 1800.0 * (lat - 26.6)
+               + 600.0 * math.sin(lon * 7.0) * math.cos(lat * 5.0))
+
+
+def _terrain(dem, kind):
+    elev = next(iter(dem._bands.values()))
+    d = 0.0003  # ~30 m in degrees
+
+    def fn(lon, lat):
+        dx_m = d * 111320.0 * math.cos(math.radians(lat))
+        dy_m = d * 110540.0
+        dzdx = (elev(lon + d, lat) - elev(lon - d, lat)) / (2 * dx_m)
+        dzdy = (elev(lon, lat + d) - elev(lon, lat - d)) / (2 * dy_m)
+        if kind == "slope":
+            return math.degrees(math.atan(math.hypot(dzdx, dzdy)))
+        return (math.degrees(math.atan2(-dzdx, -dzdy)) + 360.0) % 360.0
+
+    return Image({kind: fn})
+
+
+_PIXEL_DEG = 0.0001  # One 10 m pixel, matching the snapping in _noise()
+
+
+class Kernel:
+    def __init__(self, radius):
+        self.radius = int(radius)
+
+    @staticmethod
+    def square(radius, units="pixels"):
+        return Kernel(radius)
+
+
+class Terrain:
+    @staticmethod
+    def slope(dem):
+        return _terrain(dem, "slope")
+
+    @staticmethod
+    def aspect(dem):
+        return _terrain(dem, "aspect")
+
+
+# Rough global scene counts per year, for ImageCollection.size()
+_SCENES_PER_YEAR = {
+    "GOOGLE/SATELLITE_EMBEDDING/V1/ANNUAL": 90_000,
+    "COPERNICUS/S2_CLOUD_PROBABILITY": 2_500_000,
+    "COPERNICUS/S2_SR_HARMONIZED": 2_500_000,
+    "COPERNICUS/S1_GRD": 400_000,
+}
+_SCENE_FOOTPRINT_DEG = 1.0  # Scenes within this of a region intersect it
+_LAND_AREA_DEG2 = 360.0 * 150.0
+
+# Synthetic band definitions per collection: band -> (low, high)
+_EMBEDDING_BANDS = {f"A{i:02d}": (-0.3, 0.3) for i in range(64)}
+_COLLECTION_BANDS = {
+    "GOOGLE/SATELLITE_EMBEDDING/V1/ANNUAL": _EMBEDDING_BANDS,
+    "COPERNICUS/S2_CLOUD_PROBABILITY": {"probability": (0.0, 100.0)},
+    "COPERNICUS/S2_SR_HARMONIZED": {
+        b: (0.0, 5000.0)
+        for b in ["B1", "B2", "B3", "B4", "B5", "B6", "B7",
+                  "B8", "B8A", "B9", "B11", "B12"]
+    },
+    "COPERNICUS/S1_GRD": {"VV": (-25.0, -5.0), "VH": (-30.0, -10.0)},
+    "NASA/NASADEM_HGT/001": {"elevation": None},
+}
+
+
+def _band_fn(seed, low, high):
+    return lambda lon, lat: low + (high - low) * _noise(seed, lon, lat)
+
+
+def _collection_image(collection_id, dates, band_names=None):
+    ranges = _COLLECTION_BANDS.get(collection_id, {})
+    bands = {}
+    for b in band_names or list(ranges):
+        if b == "elevation":
+            bands[b] = _elevation
+        else:
+            bands[b] = _band_fn(_seed(collection_id, dates, b),
+                                *(ranges.get(b) or (0.0, 1.0)))
+    return Image(bands)
+
+
+class ImageCollection:
+    def __init__(self, collection_id, dates=None, keep_fraction=1.0, bands=None,
+                 region=None):
+        if isinstance(collection_id, _MappedImages):
+            self._image = collection_id.image
+            collection_id = None
+        else:
+            self._image = None
+        self.collection_id = collection_id
+        self._dates = dates
+        self._keep = keep_fraction
+        self._region = region
+        self._band_names = bands or list(_COLLECTION_BANDS.get(collection_id, {}))
+
+    def _derive(self, **changes):
+        state = dict(dates=self._dates, keep_fraction=self._keep,
+                     bands=self._band_names, region=self._region)
+        state.update(changes)
+        return ImageCollection(self.collection_id, **state)
+
+    def filterDate(self, start, end):
+        return self._derive(dates=(start, end))
+
+    def filterBounds(self, geometry):
+        return self._derive(region=geometry)
+
+    def filter(self, flt):
+        # Metadata filters on cloudiness keep roughly half of the scenes
+        if flt[0] == "lt":
+            return self._derive(keep_fraction=self._keep * 0.5)
+        return self
+
+    def select(self, names):
+        if isinstance(names, str):
+            names = [names]
+        return self._derive(bands=list(names))
+
+    def _composite(self):
+        if self._image is not None:
+            return self._image
+        return _collection_image(self.collection_id, self._dates, self._band_names)
+
+    def mosaic(self):
+        return self._composite()
+
+    def mean(self):
+        return self._composite()
+
+    def median(self):
+        return self._composite()
+
+    def qualityMosaic(self, band):
+        return self._composite()
+
+    def _scene_count(self):
+        """Scenes in the date window and region: global rate x time x area."""
+        years = 8.0
+        if self._dates:
+            start, end = (time.strptime(d, "%Y-%m-%d") for d in self._dates)
+            years = (time.mktime(end) - time.mktime(start)) / (365.25 * 86400)
+        area = 1.0
+        if self._region is not None:
+            r, pad = self._region, _SCENE_FOOTPRINT_DEG
+            area = min(1.0, (r.east - r.west + pad) * (r.north - r.south + pad)
+                       / _LAND_AREA_DEG2)
+        per_year = _SCENES_PER_YEAR.get(self.collection_id, 0)
+        return int(round(per_year * years * area * self._keep))
+
+    def size(self):
+        return _Number(self._scene_count())
+
+    def count(self):
+        # Scene counts share a seed across filters so clear <= total holds
+        seed = _seed(self.collection_id, self._dates, "count")
+        keep = self._keep
+        fn = lambda lon, lat: int(_noise(seed, lon, lat) * 30 * keep)  # noqa: E731
+        return Image((b, fn) for b in self._band_names)
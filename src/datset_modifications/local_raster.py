@@ -0,0 +1,300 @@
+"""
+Local raster sampling backend: point values from exported tiles on disk.
+
+Once the embedding mosaic and the DEM for the study area are exported (e.g.
+Export.image.toDrive GeoTIFFs), point sampling no longer needs Earth Engine.
+A TileSet indexes a directory of tiles and samples them in three steps:
+
+  1. every point is assigned to the first tile containing it, per layer
+     (tiles with the same band list form a layer, so embedding and DEM tiles
+     can overlap), via the inverse of each tile's affine transform;
+  2. all points of a tile are read in one vectorised gather -- fancy indexing
+     into a memory-mapped array, or one windowed read of the rows/columns
+     the points span for GeoTIFFs;
+  3. tiles are gathered in parallel on a thread pool.
+
+Two tile formats are read:
+  - "<name>.npy" + "<name>.json": a float32 (rows, cols, bands) array,
+    pixel-interleaved so one point's bands are contiguous in the memory map,
+    plus a sidecar {"crs", "transform", "bands", "nodata"};
+  - "<name>.tif": GeoTIFF read through rasterio (optional dependency, only
+    imported when a .tif is present).
+
+"transform" is the GDAL/rasterio affine [a, b, c, d, e, f] mapping
+(col, row) -> (x, y) = (a*col + b*row + c, d*col + e*row + f), and "crs"
+is EPSG:4326 or a WGS84 UTM zone (EPSG:326xx / 327xx).
+
+sample_features() returns the same FeatureCollection layout as the Earth
+Engine samplers in ee_sampling, so the extraction scripts' batching, caching
+and writers work unchanged. make_synthetic_tiles() writes a test tile set
+whose values are a known function of the pixel centre.
+"""
+
+import hashlib
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from pixel_grid import latlon_to_utm_arrays
+
+LOCAL_TILE_WORKERS = os.cpu_count() or 4
+
+
+def _lonlat_to_crs(crs, lats, lons):
+    """Project lat/lon arrays into a tile CRS; returns (x, y)."""
+    code = str(crs).upper().replace("EPSG:", "")
+    if code == "4326":
+        return lons, lats
+    if len(code) == 5 and code[:3] in ("326", "327"):
+        return latlon_to_utm_arrays(lats, lons, int(code[3:]), south=code[:3] == "327")
+    raise ValueError(f"Unsupported tile CRS {crs!r}; expected EPSG:4326 or a UTM zone")
+
+
+class _Tile:
+    """One tile: georeferencing plus a vectorised gather of pixels."""
+
+    def __init__(self, path, crs, transform, bands, nodata=None):
+        self.path = path
+        self.crs = crs
+        self.bands = list(bands)
+        self.nodata = nodata
+        a, b, c, d, e, f = transform
+        self.transform = (a, b, c, d, e, f)
+        det = a * e - b * d
+        if det == 0:
+            raise ValueError(f"{path}: singular transform {transform}")
+        self._inverse = (e / det, -b / det, -d / det, a / det)  # [[ia, ib], [id, ie]]
+        self.shape = (0, 0)  # (rows, cols), set by subclasses
+
+    def pixel_of(self, lats, lons):
+        """(rows, cols, inside) of lat/lon arrays in this tile."""
+        x, y = _lonlat_to_crs(self.crs, lats, lons)
+        ia, ib, id_, ie = self._inverse
+        dx = x - self.transform[2]
+        dy = y - self.transform[5]
+        cols = np.floor(ia * dx + ib * dy).astype(np.int64)
+        rows = np.floor(id_ * dx + ie * dy).astype(np.int64)
+        inside = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+        return rows, cols, inside
+
+    def _gather(self, rows, cols):
+        raise NotImplementedError
+
+    def _window(self, row0, row1, col0, col1):
+        raise NotImplementedError
+
+    def _clean(self, values):
+        values = np.array(values, dtype=np.float32)
+        if self.nodata is not None:
+            values[values == self.nodata] = np.nan
+        return values
+
+    def gather(self, rows, cols):
+        """float32 (len(rows), bands) pixel values; nodata becomes NaN."""
+        return self._clean(self._gather(rows, cols))
+
+    def window(self, row0, row1, col0, col1):
+        """float32 (row1 - row0, col1 - col0, bands) block; nodata becomes NaN."""
+        return self._clean(self._window(row0, row1, col0, col1))
+
+
+class _NpyTile(_Tile):
+    """(rows, cols, bands) .npy read through a memory map."""
+
+    def __init__(self, path, meta):
+        super().__init__(path, meta.get("crs", "EPSG:4326"), meta["transform"],
+                         meta["bands"], meta.get("nodata"))
+        self.data = np.load(path, mmap_mode="r")
+        if self.data.ndim != 3 or self.data.shape[2] != len(self.bands):
+            raise ValueError(f"{path}: expected (rows, cols, {len(self.bands)}), "
+                             f"got {self.data.shape}")
+        self.shape = self.data.shape[:2]
+
+    def _gather(self, rows, cols):
+        return self.data[rows, cols]
+
+    def _window(self, row0, row1, col0, col1):
+        return self.data[row0:row1, col0:col1]
+
+
+class _GeoTiffTile(_Tile):
+    """GeoTIFF read through rasterio, one window per gather."""
+
+    def __init__(self, path):
+        import rasterio  # Optional: only needed for .tif tiles
+
+        self._rasterio = rasterio
+        with rasterio.open(path) as src:
+            bands = [d or f"b{i + 1}" for i, d in enumerate(src.descriptions)]
+            t = src.transform
+            super().__init__(path, src.crs.to_string(), (t.a, t.b, t.c, t.d, t.e, t.f),
+                             bands, src.nodata)
+            self.shape = (src.height, src.width)
+
+    def _gather(self, rows, cols):
+        from rasterio.windows import Window
+
+        r0, c0 = int(rows.min()), int(cols.min())
+        window = Window(c0, r0, int(cols.max()) - c0 + 1, int(rows.max()) - r0 + 1)
+        # A handle per call keeps concurrent gathers thread-safe
+        with self._rasterio.open(self.path) as src:
+            block = src.read(window=window)  # (bands, h, w)
+        return block[:, rows - r0, cols - c0].T
+
+    def _window(self, row0, row1, col0, col1):
+        from rasterio.windows import Window
+
+        with self._rasterio.open(self.path) as src:
+            block = src.read(window=Window(col0, row0, col1 - col0, row1 - row0))
+        return block.transpose(1, 2, 0)
+
+
+def open_tile(path):
+    """_Tile for a .npy (with .json sidecar), .tif or .vrt (mosaic of tiles) path."""
+    if path.endswith(".npy"):
+        with open(path[:-4] + ".json", "r", encoding="utf-8") as f:
+            return _NpyTile(path, json.load(f))
+    if path.endswith((".tif", ".tiff", ".vrt")):
+        return _GeoTiffTile(path)
+    raise ValueError(f"Unsupported tile format: {path}")
+
+
+class TileSet:
+    """All tiles of a directory, sampled by point with one gather per tile."""
+
+    def __init__(self, directory, max_workers=LOCAL_TILE_WORKERS):
+        self.directory = directory
+        self.max_workers = max_workers
+        names = sorted(n for n in os.listdir(directory)
+                       if n.endswith((".npy", ".tif", ".tiff")))
+        if not names:
+            raise FileNotFoundError(f"No .npy / .tif tiles in {directory}")
+        self.tiles = [open_tile(os.path.join(directory, n)) for n in names]
+
+        # Layers: tiles sharing a band list; a band is served by its first layer
+        self.layers = {}
+        for tile in self.tiles:
+            self.layers.setdefault(tuple(tile.bands), []).append(tile)
+        self._owner = {}
+        for layer_bands in self.layers:
+            for b in layer_bands:
+                self._owner.setdefault(b, layer_bands)
+        self.bands = list(self._owner)
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def fingerprint(self):
+        """Short hash of tile names, sizes and mtimes (for cache namespaces)."""
+        h = hashlib.sha1()
+        for tile in self.tiles:
+            st = os.stat(tile.path)
+            h.update(f"{os.path.basename(tile.path)}:{st.st_size}:{int(st.st_mtime)};".encode())
+        return h.hexdigest()[:12]
+
+    def summary(self):
+        return (f"{len(self.tiles)} tiles in {len(self.layers)} layer(s), "
+                f"{len(self.bands)} bands, {self.max_workers} workers")
+
+    def assign(self, lats, lons):
+        """[(tile, point indices, rows, cols)] for every tile holding points."""
+        tasks = []
+        for tiles in self.layers.values():
+            pending = np.arange(len(lats))
+            for tile in tiles:
+                if not len(pending):
+                    break
+                rows, cols, inside = tile.pixel_of(lats[pending], lons[pending])
+                if inside.any():
+                    tasks.append((tile, pending[inside], rows[inside], cols[inside]))
+                    pending = pending[~inside]
+        return tasks
+
+    def sample(self, lats, lons, bands=None):
+        """
+        float32 (n, len(bands)) values at the given coordinates; NaN where a
+        point is outside every tile, the pixel is nodata, or no layer has the band.
+        """
+        bands = self.bands if bands is None else list(bands)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        out = np.full((len(lats), len(bands)), np.nan, dtype=np.float32)
+        band_pos = {b: i for i, b in enumerate(bands)}
+        tasks = []
+        for tile, idx, rows, cols in self.assign(lats, lons):
+            layer = tuple(tile.bands)
+            src = [j for j, b in enumerate(tile.bands)
+                   if b in band_pos and self._owner[b] == layer]
+            if src:
+                tasks.append((tile, idx, rows, cols, src,
+                              [band_pos[tile.bands[j]] for j in src]))
+
+        def run(task):
+            tile, idx, rows, cols, src, dst = task
+            # Rows of different tasks never overlap within a layer, and
+            # layers write disjoint columns, so writes need no lock
+            out[np.ix_(idx, dst)] = tile.gather(rows, cols)[:, src]
+
+        if self.max_workers > 1 and len(tasks) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                list(pool.map(run, tasks))
+        else:
+            for task in tasks:
+                run(task)
+        return out
+
+    def sample_features(self, points_batch, bands=None):
+        """sample() in the ee_sampling FeatureCollection layout ({"SNo", band: value})."""
+        bands = self.bands if bands is None else list(bands)
+        values = self.sample([p["lat"] for p in points_batch],
+                             [p["lon"] for p in points_batch], bands)
+        features = []
+        for p, row in zip(points_batch, values.tolist()):
+            props = {"SNo": p["SNo"]}
+            props.update((b, None if math.isnan(v) else v) for b, v in zip(bands, row))
+            features.append({"type": "Feature", "geometry": None, "properties": props})
+        return {"type": "FeatureCollection", "features": features}
+
+
+def synthetic_value(band_idx, lat, lon):
+    """Value of band `band_idx` at a pixel centre in make_synthetic_tiles()."""
+    return np.float32(np.sin(lat * 3.0 + band_idx) * np.cos(lon * 2.0 - band_idx))
+
+
+def make_synthetic_tiles(directory, bounds, bands, tile_px=256, pixel_deg=0.001,
+                         prefix="tile", nodata=-9999.0):
+    """
+    Write an EPSG:4326 tile grid covering bounds=(min_lon, min_lat, max_lon,
+    max_lat) as .npy + .json tiles of tile_px x tile_px pixels. Pixel values
+    are synthetic_value(band, centre lat, centre lon); the last row of every
+    tile is nodata. Returns the tile paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    min_lon, min_lat, max_lon, max_lat = bounds
+    tile_deg = tile_px * pixel_deg
+    n_x = max(1, math.ceil((max_lon - min_lon) / tile_deg))
+    n_y = max(1, math.ceil((max_lat - min_lat) / tile_deg))
+    centres = (np.arange(tile_px) + 0.5) * pixel_deg
+    paths = []
+    for ty in range(n_y):
+        for tx in range(n_x):
+            west = min_lon + tx * tile_deg
+            north = max_lat - ty * tile_deg
+            lat = (north - centres)[:, None]
+            lon = (west + centres)[None, :]
+            data = np.empty((tile_px, tile_px, len(bands)), dtype=np.float32)
+            for b in range(len(bands)):
+                data[:, :, b] = synthetic_value(b, lat, lon)
+            data[-1] = nodata
+            name = f"{prefix}_{ty:03d}_{tx:03d}"
+            path = os.path.join(directory, name + ".npy")
+            np.save(path, data)
+            with open(os.path.join(directory, name + ".json"), "w", encoding="utf-8") as f:
+                json.dump({"crs": "EPSG:4326",
+                           "transform": [pixel_deg, 0.0, west, 0.0, -pixel_deg, north],
+                           "bands": list(bands), "nodata": nodata}, f)
+            paths.append(path)
+    return paths
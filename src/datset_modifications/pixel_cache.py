@@ -0,0 +1,120 @@
+"""
+Persistent SQLite cache of sampled pixel values.
+
+Values are keyed by (namespace, pixel), where the namespace encodes the
+collection(s), year / date window and band set that were sampled, and the
+pixel is the snapped UTM pixel key from pixel_grid.pixel_keys(). Extraction
+looks pixels up here first and only sends cache misses to Earth Engine, so
+re-runs over overlapping point sets cost almost no network time.
+
+The cache is bounded: once it holds more than `max_entries` rows, the least
+recently used rows are evicted. The row count is read once on open and then
+tracked per insert, so a batch does not cost a full-table COUNT(*).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+def make_namespace(*parts, bands=()):
+    """Namespace string from descriptive parts plus a short hash of the band set."""
+    band_hash = hashlib.sha1(",".join(bands).encode()).hexdigest()[:12]
+    return "|".join(str(p) for p in parts) + f"|bands:{band_hash}"
+
+
+def _pixel_str(key):
+    return ":".join(str(k) for k in key)
+
+
+class PixelCache:
+    """Size-bounded LRU cache of {namespace, pixel} -> JSON value."""
+
+    def __init__(self, path, max_entries=2_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pixels ("
+            " namespace TEXT NOT NULL,"
+            " pixel TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (namespace, pixel))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS pixels_last_used ON pixels (last_used)"
+        )
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM pixels").fetchone()[0]
+
+    def get_many(self, namespace, keys):
+        """Return {key: value} for every key found; touches their LRU time."""
+        found = {}
+        by_str = {_pixel_str(k): k for k in keys}
+        items = list(by_str)
+        now = time.time()
+        for i in range(0, len(items), 500):
+            chunk = items[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT pixel, value FROM pixels WHERE namespace = ? AND pixel IN ({marks})",
+                [namespace] + chunk,
+            ).fetchall()
+            for pixel, value in rows:
+                found[by_str[pixel]] = json.loads(value)
+            if rows:
+                self._conn.executemany(
+                    "UPDATE pixels SET last_used = ? WHERE namespace = ? AND pixel = ?",
+                    [(now, namespace, pixel) for pixel, _ in rows],
+                )
+        self._conn.commit()
+        return found
+
+    def put_many(self, namespace, items):
+        """Insert or replace {key: value} entries, then evict if over size."""
+        now = time.time()
+        # Replaced rows do not grow the table, so count them first (indexed)
+        pixels = [_pixel_str(k) for k in items]
+        existing = 0
+        for i in range(0, len(pixels), 500):
+            chunk = pixels[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            existing += self._conn.execute(
+                f"SELECT COUNT(*) FROM pixels WHERE namespace = ? AND pixel IN ({marks})",
+                [namespace] + chunk,
+            ).fetchone()[0]
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO pixels (namespace, pixel, value, last_used) "
+            "VALUES (?, ?, ?, ?)",
+            [(namespace, pixel, json.dumps(v, separators=(",", ":")), now)
+             for pixel, v in zip(pixels, items.values())],
+        )
+        self._conn.commit()
+        self._count += len(pixels) - existing
+        self.evict()
+
+    def __len__(self):
+        return self._count
+
+    def evict(self):
+        """Drop least recently used rows beyond max_entries. Returns rows dropped."""
+        excess = self._count - self.max_entries
+        if excess <= 0:
+            return 0
+        self._conn.execute(
+            "DELETE FROM pixels WHERE rowid IN ("
+            " SELECT rowid FROM pixels ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._conn.commit()
+        self._count -= excess
+        return excess
+
+    def close(self):
+        self._conn.close()
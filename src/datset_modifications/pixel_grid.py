@@ -0,0 +1,188 @@
+"""
+Snap points to the 10 m UTM pixel grid and deduplicate them before extraction.
+
+The Satellite Embedding and Sentinel-2 images are stored in UTM tiles whose
+10 m pixel edges fall on multiples of 10 m easting/northing, so flooring a
+point's UTM coordinates to the pixel size gives the pixel it will be sampled
+from -- as long as it is sampled in that zone's UTM projection, which
+ee_sampling requests instead of Earth Engine's default EPSG:4326 grid. Points
+that share a pixel then get identical values, so only one representative per
+pixel needs to be sent to Earth Engine; its result is then fanned back out to
+every SNo in the pixel.
+
+spatial_order() sorts points along a Hilbert (or Z-order) curve over their
+lat/lon bounding box, so that consecutive points -- and therefore each
+batch -- cover a compact area and a request touches few image tiles,
+optionally only within windows of consecutive input points.
+"""
+
+import hashlib
+
+import numpy as np
+
+# WGS84 ellipsoid / UTM constants
+_A = 6378137.0
+_F = 1 / 298.257223563
+_K0 = 0.9996
+_E2 = _F * (2 - _F)
+_EP2 = _E2 / (1 - _E2)
+
+CURVE_BITS = 16  # Curve grid of 2**16 x 2**16 cells over the points' bounding box
+POINT_ORDERS = ("input", "hilbert", "zorder")
+
+
+def utm_zone(lon):
+    """UTM zone number (1-60) for a longitude."""
+    return int((lon + 180) // 6) % 60 + 1
+
+
+def latlon_to_utm_arrays(lat, lon, zone, south=False):
+    """
+    Project WGS84 lat/lon (scalars or NumPy arrays) into one fixed UTM zone.
+    Returns (easting, northing) arrays in metres.
+    """
+    lon0 = np.radians((zone - 1) * 6 - 180 + 3)
+    phi = np.radians(np.asarray(lat, dtype=np.float64))
+    lam = np.radians(np.asarray(lon, dtype=np.float64))
+
+    sin_phi, cos_phi, tan_phi = np.sin(phi), np.cos(phi), np.tan(phi)
+    n = _A / np.sqrt(1 - _E2 * sin_phi ** 2)
+    t = tan_phi ** 2
+    c = _EP2 * cos_phi ** 2
+    a = cos_phi * (lam - lon0)
+
+    e4, e6 = _E2 ** 2, _E2 ** 3
+    m = _A * (
+        (1 - _E2 / 4 - 3 * e4 / 64 - 5 * e6 / 256) * phi
+        - (3 * _E2 / 8 + 3 * e4 / 32 + 45 * e6 / 1024) * np.sin(2 * phi)
+        + (15 * e4 / 256 + 45 * e6 / 1024) * np.sin(4 * phi)
+        - (35 * e6 / 3072) * np.sin(6 * phi)
+    )
+
+    easting = _K0 * n * (
+        a + (1 - t + c) * a ** 3 / 6
+        + (5 - 18 * t + t ** 2 + 72 * c - 58 * _EP2) * a ** 5 / 120
+    ) + 500000.0
+    northing = _K0 * (m + n * tan_phi * (
+        a ** 2 / 2
+        + (5 - t + 9 * c + 4 * c ** 2) * a ** 4 / 24
+        + (61 - 58 * t + t ** 2 + 600 * c - 330 * _EP2) * a ** 6 / 720
+    ))
+    if south:
+        northing = northing + 10000000.0
+    return easting, northing
+
+
+def coord_hash(lat, lon):
+    """Short hash of a point's coordinates rounded to 1e-7 degrees (~1 cm)."""
+    return hashlib.sha1(f"{float(lat):.7f},{float(lon):.7f}".encode()).hexdigest()[:16]
+
+
+def pixel_keys(lats, lons, scale=10):
+    """
+    (zone, column, row) of the `scale`-metre UTM pixel containing each point,
+    projected in one vectorised pass per UTM zone.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    zones = ((lons + 180) // 6).astype(np.int64) % 60 + 1
+    south = lats < 0
+    cols = np.empty(len(lats), dtype=np.int64)
+    rows = np.empty(len(lats), dtype=np.int64)
+    for zone, is_south in set(zip(zones.tolist(), south.tolist())):
+        sel = (zones == zone) & (south == is_south)
+        easting, northing = latlon_to_utm_arrays(lats[sel], lons[sel], zone, is_south)
+        cols[sel] = np.floor(easting / scale)
+        rows[sel] = np.floor(northing / scale)
+    return list(zip(zones.tolist(), cols.tolist(), rows.tolist()))
+
+
+def dedupe_points(points, scale=10):
+    """
+    Collapse points that fall in the same pixel.
+
+    Returns (representatives, groups) where `representatives` keeps the first
+    point seen in each pixel (in input order) and `groups` maps each
+    representative SNo to the list of all SNos in its pixel.
+    """
+    by_pixel = {}
+    representatives = []
+    groups = {}
+    keys = pixel_keys([p["lat"] for p in points], [p["lon"] for p in points], scale)
+    for p, key in zip(points, keys):
+        rep = by_pixel.get(key)
+        if rep is None:
+            by_pixel[key] = p
+            representatives.append(p)
+            groups[p["SNo"]] = [p["SNo"]]
+        else:
+            groups[rep["SNo"]].append(p["SNo"])
+    return representatives, groups
+
+
+def fan_out(results, groups):
+    """Copy each representative's result to every SNo in its pixel group."""
+    expanded = {}
+    for rep_sno, value in results.items():
+        for sno in groups.get(rep_sno, [rep_sno]):
+            expanded[sno] = value
+    return expanded
+
+
+def hilbert_index(x, y, bits=CURVE_BITS):
+    """Distance along the Hilbert curve of cell (x, y) in a 2**bits grid."""
+    n = 1 << bits
+    d = 0
+    s = n >> 1
+    while s:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x, y = n - 1 - x, n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return d
+
+
+def zorder_index(x, y, bits=CURVE_BITS):
+    """Morton code of cell (x, y): the bits of x and y interleaved."""
+    d = 0
+    for i in range(bits):
+        d |= ((x >> i) & 1) << (2 * i) | ((y >> i) & 1) << (2 * i + 1)
+    return d
+
+
+def spatial_order(points, curve="hilbert", bits=CURVE_BITS, window=None):
+    """
+    Return the points sorted along a space-filling curve ("hilbert" or
+    "zorder") over their lat/lon bounding box; "input" keeps the given order.
+    Only the request order changes -- callers still key results by SNo.
+
+    With `window`, points are sorted only within consecutive runs of that many
+    input points, so results still complete roughly in input order (a caller
+    streaming rows in input order can advance after every window).
+    """
+    if curve == "input" or len(points) < 2:
+        return list(points)
+    if curve not in POINT_ORDERS:
+        raise ValueError(f"Unknown point order {curve!r}; expected one of {POINT_ORDERS}")
+    index = hilbert_index if curve == "hilbert" else zorder_index
+    min_lat = min(p["lat"] for p in points)
+    min_lon = min(p["lon"] for p in points)
+    span = max(max(p["lat"] for p in points) - min_lat,
+               max(p["lon"] for p in points) - min_lon) or 1.0
+    cells = (1 << bits) - 1
+
+    def key(p):
+        x = int((p["lon"] - min_lon) / span * cells)
+        y = int((p["lat"] - min_lat) / span * cells)
+        return index(x, y, bits)
+
+    if not window:
+        return sorted(points, key=key)
+    ordered = []
+    for start in range(0, len(points), window):
+        ordered.extend(sorted(points[start:start + window], key=key))
+    return ordered
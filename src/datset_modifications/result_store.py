@@ -0,0 +1,128 @@
+"""
+Array-backed store for per-point extraction results.
+
+Instead of one Python dict of band -> float per point, results live in
+preallocated float32 NumPy arrays with one row per point (SNo -> row index).
+Missing values are NaN. Each column is either a scalar (shape (n,)) or a
+fixed-width vector (shape (n, width)), e.g. the 64 embedding bands.
+
+Large columns can be backed by a .npy file instead of RAM (`out_files`):
+the file is created up front with its final shape, e.g. (n, k, k, 64), and
+rows are written straight into the memory map.
+
+Rows are marked complete as batches finish; `take_ready()` hands back the
+longest run of complete rows that has not been written yet, so the output
+file can be streamed in input order while the run is still going.
+"""
+
+import numpy as np
+
+
+class ResultStore:
+    """Preallocated float32 columns indexed by SNo."""
+
+    def __init__(self, snos, columns, out_files=None):
+        """
+        snos:      SNo of every output row, in output order.
+        columns:   {name: width}, width 1 for a scalar column.
+        out_files: optional {name: (path, shape)} for columns to keep in a
+                   memory-mapped .npy of that shape (shape[0] == len(snos),
+                   product of the rest == width).
+        """
+        self.snos = list(snos)
+        self.index = {sno: i for i, sno in enumerate(self.snos)}
+        n = len(self.snos)
+        self.widths = dict(columns)
+        self.arrays = {}
+        self._memmaps = {}
+        for name, width in self.widths.items():
+            if out_files and name in out_files:
+                path, shape = out_files[name]
+                mm = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32,
+                                               shape=tuple(shape))
+                mm[:] = np.nan
+                self._memmaps[name] = mm
+                self.arrays[name] = mm.reshape((n, width) if width > 1 else n)
+            else:
+                self.arrays[name] = np.full((n, width) if width > 1 else n, np.nan,
+                                            dtype=np.float32)
+        self.complete = np.zeros(n, dtype=bool)
+        self._next_unwritten = 0
+
+    def __len__(self):
+        return len(self.snos)
+
+    def put(self, sno, column, values):
+        """Store one value (or vector) for an SNo; None entries stay NaN."""
+        row = self.index.get(sno)
+        if row is None:
+            return
+        if isinstance(values, np.ndarray):
+            self.arrays[column][row] = values
+        elif self.widths[column] > 1:
+            self.arrays[column][row] = [np.nan if v is None else v for v in values]
+        else:
+            self.arrays[column][row] = np.nan if values is None else values
+
+    def put_rows(self, snos, column, values):
+        """Store row i of `values` (NaN = missing) for snos[i]; unknown SNos are skipped."""
+        rows = np.fromiter((self.index.get(sno, -1) for sno in snos), dtype=np.int64)
+        known = rows >= 0
+        self.arrays[column][rows[known]] = np.asarray(values, dtype=np.float32)[known]
+
+    def mark_complete(self, snos):
+        for sno in snos:
+            row = self.index.get(sno)
+            if row is not None:
+                self.complete[row] = True
+
+    def take_ready(self, final=False):
+        """
+        Return (start, stop) of the next run of complete rows not yet taken,
+        or None. With final=True every remaining row is returned.
+        """
+        start = self._next_unwritten
+        n = len(self.snos)
+        if start >= n:
+            return None
+        if final:
+            stop = n
+        else:
+            pending = np.flatnonzero(~self.complete[start:])
+            stop = start + pending[0] if len(pending) else n
+            if stop == start:
+                return None
+        self._next_unwritten = stop
+        return start, stop
+
+    def column(self, name, rows=slice(None)):
+        return self.arrays[name][rows]
+
+    def flush(self):
+        """Write memory-mapped columns to disk."""
+        for mm in self._memmaps.values():
+            mm.flush()
+
+    def save_npy(self, name, path, shape=None):
+        """
+        Write one column as a float32 .npy file that np.load can memory-map,
+        optionally reshaped (e.g. (n, years * 64) -> (n, years, 64)).
+        """
+        values = self.arrays[name]
+        if shape is not None:
+            values = values.reshape(shape)
+        out = np.lib.format.open_memmap(
+            path, mode="w+", dtype=np.float32, shape=values.shape
+        )
+        out[:] = values
+        out.flush()
+        del out
+
+
+def format_value(v, integer=False):
+    """CSV cell for a float32 value: blank for NaN, shortest round-trip text."""
+    if np.isnan(v):
+        return ""
+    if integer:
+        return str(int(v))
+    return f"{float(v):.9g}"
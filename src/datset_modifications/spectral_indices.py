@@ -0,0 +1,125 @@
+"""
+Spectral indices computed locally from sampled Sentinel-2 bands.
+
+The multi-source extractor only samples the raw scaled S2 reflectances
+(B2, B3, B4, B8, B11, B12, x 0.0001); every index is derived here in one
+vectorised float32 pass over the (n, bands) matrix. A new index is one entry
+in SPECTRAL_INDICES (or a register_index() call) and costs milliseconds over
+an existing output instead of an Earth Engine re-run.
+
+Division by zero (e.g. both bands 0 on masked or no-data pixels) gives NaN,
+as do missing input bands.
+
+Run as a script to append index columns to an existing CSV that has the band
+columns, e.g. dataset_1_multisource.csv:
+
+    python spectral_indices.py IN.csv OUT.csv --indices NDSI NDGI
+"""
+
+import argparse
+import csv
+
+import numpy as np
+
+from result_store import format_value
+
+CHUNK_ROWS = 100_000  # Rows per chunk when appending indices to a CSV
+
+
+def safe_divide(num, den):
+    """num / den as float32, NaN where den is 0 or either side is NaN."""
+    out = np.full(np.broadcast(num, den).shape, np.nan, dtype=np.float32)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def normalized_difference(a, b):
+    return safe_divide(a - b, a + b)
+
+
+# name: (input bands, function of those band columns)
+# B2=Blue, B3=Green, B4=Red, B8=NIR, B11=SWIR1, B12=SWIR2
+SPECTRAL_INDICES = {
+    "NDVI": (("B8", "B4"), normalized_difference),
+    "NDWI": (("B8", "B11"), normalized_difference),
+    "MNDWI": (("B3", "B11"), normalized_difference),
+    "EVI": (("B8", "B4", "B2"),
+            lambda nir, red, blue: 2.5 * safe_divide(nir - red,
+                                                     nir + 6 * red - 7.5 * blue + 1)),
+    "SAVI": (("B8", "B4"),
+             lambda nir, red: 1.5 * safe_divide(nir - red, 0.5 + nir + red)),
+    "NDSI": (("B3", "B11"), normalized_difference),  # Snow
+    "NDGI": (("B3", "B4"), normalized_difference),  # Glacier (Keshri et al. 2009)
+}
+
+
+def register_index(name, bands, func):
+    """Add (or replace) an index computed as func(*band columns)."""
+    SPECTRAL_INDICES[name] = (tuple(bands), func)
+
+
+def compute_indices(values, band_names, names=None):
+    """
+    float32 (n, len(names)) index matrix from an (n, len(band_names)) band
+    matrix. `names` defaults to every registered index.
+    """
+    names = list(SPECTRAL_INDICES) if names is None else list(names)
+    values = np.asarray(values, dtype=np.float32)
+    pos = {b: i for i, b in enumerate(band_names)}
+    out = np.empty((len(values), len(names)), dtype=np.float32)
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        for j, name in enumerate(names):
+            bands, func = SPECTRAL_INDICES[name]
+            missing = [b for b in bands if b not in pos]
+            if missing:
+                raise KeyError(f"{name} needs bands {missing}, not in {list(band_names)}")
+            out[:, j] = func(*(values[:, pos[b]] for b in bands))
+    return out
+
+
+def index_bands(names):
+    """Input bands needed for the given indices, in first-use order."""
+    bands = []
+    for name in names:
+        bands.extend(b for b in SPECTRAL_INDICES[name][0] if b not in bands)
+    return bands
+
+
+def append_indices(in_path, out_path, names, chunk_rows=CHUNK_ROWS):
+    """Copy a CSV, adding one column per index; other cells are kept verbatim."""
+    bands = index_bands(names)
+    n_rows = 0
+    with open(in_path, "r", encoding="utf-8") as fin, \
+            open(out_path, "w", encoding="utf-8", newline="") as fout:
+        reader = csv.reader(fin)
+        writer = csv.writer(fout)
+        header = next(reader)
+        cols = [header.index(b) for b in bands]
+        keep = [i for i, h in enumerate(header) if h not in names]
+        writer.writerow([header[i] for i in keep] + list(names))
+        while True:
+            rows = [row for _, row in zip(range(chunk_rows), reader)]
+            if not rows:
+                break
+            values = np.array([[float(row[c]) if row[c] else np.nan for c in cols]
+                               for row in rows], dtype=np.float32)
+            indices = compute_indices(values, bands, names)
+            for row, idx in zip(rows, indices):
+                writer.writerow([row[i] for i in keep] + [format_value(v) for v in idx])
+            n_rows += len(rows)
+    return n_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="CSV with the raw S2 band columns")
+    parser.add_argument("output", help="Output CSV (input columns + indices)")
+    parser.add_argument("--indices", nargs="+", choices=list(SPECTRAL_INDICES),
+                        default=list(SPECTRAL_INDICES))
+    args = parser.parse_args()
+    n = append_indices(args.input, args.output, args.indices)
+    print(f"{n:,} rows: added {', '.join(args.indices)} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
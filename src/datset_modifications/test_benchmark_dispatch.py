@@ -0,0 +1,14 @@
+"""Smoke test: the dispatch benchmark runs end to end on the fake backend."""
+
+import benchmark_dispatch as bench
+
+
+def test_benchmark_dispatch_runs_on_fake_backend(monkeypatch):
+    monkeypatch.setattr(bench, "N_POINTS", 200)
+    monkeypatch.setattr(bench, "BATCH_SIZE", 50)
+    monkeypatch.setattr(bench, "LATENCY_S", 0.0)
+    monkeypatch.setattr(bench, "THROTTLE_S", 0.0)
+    monkeypatch.setattr(bench, "IN_FLIGHT_LEVELS", [1, 4])
+    monkeypatch.setattr(bench, "REQUESTS_PER_SECOND", 1000.0)
+
+    assert bench.main() == {1: True, 4: True}
@@ -0,0 +1,90 @@
+"""
+Compare load time of the embeddings CSV against the binary .npy + metadata
+artifact written by extract_embeddings.py, on a synthetic file.
+
+Writes both formats for N_POINTS random points to a temporary directory, then
+times the two load paths used by train_embedding_baseline.load_embeddings().
+"""
+
+import csv
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+N_POINTS = 1_000_000
+EMB_COLS = [f"A{i:02d}" for i in range(64)]
+META_COLS = ["SNo", "lat", "lon", "label", "class_description", "bin",
+             "cloud_mean_prob", "total_scenes", "clear_scenes", "cloudy_pct"]
+BINS = ["Forest", "Tree based Ag", "Water", "Urban", "Non-Tree Ag", "Grassland/Open"]
+
+
+def write_synthetic(tmp_dir, n):
+    """Write the same synthetic data as CSV and as .npy + metadata CSV."""
+    rng = np.random.default_rng(42)
+    emb = rng.uniform(-0.3, 0.3, size=(n, 64)).astype(np.float32)
+    lat = rng.uniform(26.6, 29.5, n)
+    lon = rng.uniform(91.5, 97.4, n)
+    bins = rng.choice(BINS, n)
+    total = rng.integers(1, 30, n)
+    clear = (total * rng.uniform(0, 1, n)).astype(int)
+    prob = rng.uniform(0, 100, n)
+
+    csv_path = os.path.join(tmp_dir, "embeddings.csv")
+    npy_path = os.path.join(tmp_dir, "embeddings.npy")
+    meta_path = os.path.join(tmp_dir, "embeddings_meta.csv")
+
+    np.save(npy_path, emb)
+    with open(csv_path, "w", newline="") as f_csv, open(meta_path, "w", newline="") as f_meta:
+        w_csv, w_meta = csv.writer(f_csv), csv.writer(f_meta)
+        w_csv.writerow(META_COLS[:6] + EMB_COLS + META_COLS[6:])
+        w_meta.writerow(META_COLS)
+        for i in range(n):
+            cloudy = round((1 - clear[i] / total[i]) * 100, 1)
+            head = [i + 1, lat[i], lon[i], 101, "", bins[i]]
+            tail = [prob[i], total[i], clear[i], cloudy]
+            w_csv.writerow(head + [f"{v:.9g}" for v in emb[i]] + tail)
+            w_meta.writerow(head + tail)
+    return csv_path, npy_path, meta_path
+
+
+def load_csv(csv_path):
+    df = pd.read_csv(csv_path)
+    df = df.dropna(subset=EMB_COLS).reset_index(drop=True)
+    return df, df[EMB_COLS].values
+
+
+def load_binary(npy_path, meta_path):
+    emb = np.load(npy_path, mmap_mode="r")
+    df = pd.read_csv(meta_path)
+    valid = ~np.isnan(emb).any(axis=1)
+    return df[valid].reset_index(drop=True), np.asarray(emb[valid])
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"Writing {N_POINTS:,} synthetic points...")
+        csv_path, npy_path, meta_path = write_synthetic(tmp_dir, N_POINTS)
+        csv_mb = os.path.getsize(csv_path) / 1e6
+        bin_mb = (os.path.getsize(npy_path) + os.path.getsize(meta_path)) / 1e6
+
+        t0 = time.time()
+        df_csv, x_csv = load_csv(csv_path)
+        csv_s = time.time() - t0
+
+        t0 = time.time()
+        df_bin, x_bin = load_binary(npy_path, meta_path)
+        bin_s = time.time() - t0
+
+        max_diff = float(np.abs(x_csv - x_bin).max())
+        print(f"\n  {'Format':<16} {'Size (MB)':>10} {'Load (s)':>10}")
+        print(f"  {'CSV':<16} {csv_mb:>10.1f} {csv_s:>10.2f}")
+        print(f"  {'NPY + meta':<16} {bin_mb:>10.1f} {bin_s:>10.2f}")
+        print(f"\n  Speedup: {csv_s / bin_s:.1f}x  "
+              f"(rows {len(df_csv):,} vs {len(df_bin):,}, max abs diff {max_diff:.2e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,24 +23,75 @@ import seaborn as sns
 # ── Configuration ──────────────────────────────────────────────────────────
 BASE = r"c:\Users\Kdixter\Desktop\GIS_Analysis_Final"
 INPUT_DATA = os.path.join(BASE, "raw_data", "dataset_1", "dataset_1_embeddings.csv")
+# Binary artifact written by extract_embeddings.py; preferred when present
+INPUT_EMB_NPY = os.path.join(BASE, "raw_data", "dataset_1", "dataset_1_embeddings.npy")
+INPUT_EMB_META = os.path.join(BASE, "raw_data", "dataset_1", "dataset_1_embeddings_meta.csv")
+# Patch mean/std features from extract_embeddings.py --patch (spatial context);
+# opt-in, adds 128 columns to the 64 embedding features
+USE_PATCH_FEATURES = False
+INPUT_PATCH_STATS = os.path.join(BASE, "raw_data", "dataset_1", "dataset_1_embeddings_patch_stats.npy")
+INPUT_PATCH_META = os.path.join(BASE, "raw_data", "dataset_1", "dataset_1_embeddings_patch_meta.csv")
 
 # Ensure models dir exists
 os.makedirs(os.path.join(BASE, "models"), exist_ok=True)
 OUTPUT_REPORT = os.path.join(BASE, "models", "spatial_baseline_embedding_report.txt")
 
 
-def load_and_prep_data():
-    print(f"Loading data from {INPUT_DATA}...")
-    df = pd.read_csv(INPUT_DATA)
-    
+def load_patch_stats(snos):
+    """
+    Patch mean/std features (n, 128) aligned with `snos`, or None when they
+    are disabled, missing, or were extracted for a different point list.
+    """
+    if not (USE_PATCH_FEATURES and os.path.exists(INPUT_PATCH_STATS)
+            and os.path.exists(INPUT_PATCH_META)):
+        return None
+    patch_snos = pd.read_csv(INPUT_PATCH_META, usecols=["SNo"])["SNo"].values
+    if not np.array_equal(patch_snos, snos):
+        print("  Patch features skipped: rows do not match the embedding metadata")
+        return None
+    print(f"Adding patch mean/std features from {INPUT_PATCH_STATS}...")
+    return np.load(INPUT_PATCH_STATS, mmap_mode="r")
+
+
+def load_embeddings():
+    """
+    Return (metadata DataFrame, feature matrix) for rows with a full
+    embedding. Uses the memory-mapped .npy + metadata CSV when available (no
+    float parsing), otherwise falls back to the full embeddings CSV. On
+    either path the patch mean/std features are appended as extra columns
+    when USE_PATCH_FEATURES is set and they are present.
+    """
     # Features (A00 - A63)
     emb_cols = [f"A{i:02d}" for i in range(64)]
-    
+
+    if os.path.exists(INPUT_EMB_NPY) and os.path.exists(INPUT_EMB_META):
+        print(f"Loading data from {INPUT_EMB_NPY}...")
+        emb = np.load(INPUT_EMB_NPY, mmap_mode="r")
+        df = pd.read_csv(INPUT_EMB_META)
+        patch = load_patch_stats(df["SNo"].values)
+        if patch is not None:
+            emb = np.hstack([emb, patch])
+        # Drop rows with null embeddings (safety check)
+        valid = ~np.isnan(emb).any(axis=1)
+        return df[valid].reset_index(drop=True), np.asarray(emb[valid])
+
+    print(f"Loading data from {INPUT_DATA}...")
+    df = pd.read_csv(INPUT_DATA)
+
+    emb = df[emb_cols].values
+    patch = load_patch_stats(df["SNo"].values)
+    if patch is not None:
+        emb = np.hstack([emb, patch])
+
     # Drop rows with null embeddings (safety check)
-    df = df.dropna(subset=emb_cols)
-    print(f"Total valid points: {len(df):,}")
+    valid = ~np.isnan(emb).any(axis=1)
+    return df[valid].reset_index(drop=True), emb[valid]
+
+
+def load_and_prep_data():
+    df, X = load_embeddings()
+    print(f"Total valid points: {len(df):,} | features: {X.shape[1]}")
     
-    X = df[emb_cols].values
     y_raw = df["bin"].values
     coords = df[['lat', 'lon']].values
     
@@ -129,7 +180,9 @@ def main():
     with open(OUTPUT_REPORT, "w") as f:
         f.write("="*60 + "\n")
         f.write("SPATIAL K-FOLD EVALUATION: SATELLITE EMBEDDINGS (2024)\n")
-        f.write("="*60 + "\n\n")
+        f.write("="*60 + "\n")
+        patch_note = " (64 embedding + 128 patch mean/std)" if X.shape[1] > 64 else ""
+        f.write(f"Features: {X.shape[1]}{patch_note}\n\n")
 
         print("\n" + "="*40)
         print("AVERAGE SPATIAL PERFORMANCE ACROSS 5 FOLDS:")